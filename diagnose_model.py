@@ -4,7 +4,7 @@ import seaborn
 import torch
 
 import models
-from self_play import MCTS, Node, SelfPlay
+from self_play import MCTS, SelfPlay, Tree
 
 
 class DiagnoseModel:
@@ -53,18 +53,19 @@ class DiagnoseModel:
 
             # Generate new root
             value, reward, policy_logits, hidden_state = self.model.recurrent_inference(
-                root.hidden_state,
-                torch.tensor([[action]]).to(root.hidden_state.device),
+                root.hidden_state(0),
+                torch.tensor([[action]]).to(root.hidden_state(0).device),
             )
             value = models.support_to_scalar(value, self.config.support_size).item()
             reward = models.support_to_scalar(reward, self.config.support_size).item()
-            root = Node(0)
+            root = Tree(self.config.num_simulations, len(self.config.action_space))
             root.expand(
+                0,
                 self.config.action_space,
                 virtual_to_play,
                 reward,
                 policy_logits,
-                hidden_state,
+                root.hidden_state_pool.store(hidden_state),
             )
 
             root, mcts_info = MCTS(self.config).run(
@@ -156,36 +157,38 @@ class DiagnoseModel:
         graph.attr("graph", rankdir="LR", splines="true", overlap="false")
         id = 0
 
-        def traverse(node, action, parent_id, best):
+        def traverse(node, action, prior, parent_id, best):
             nonlocal id
             node_id = id
             graph.node(
                 str(node_id),
-                label=f"Action: {action}\nValue: {node.value():.2f}\nVisit count: {node.visit_count}\nPrior: {node.prior:.2f}\nReward: {node.reward:.2f}",
+                label=f"Action: {action}\nValue: {root.value(node):.2f}\nVisit count: {root.visit_count[node]}\nPrior: {prior:.2f}\nReward: {root.reward[node]:.2f}",
                 color="orange" if best else "black",
             )
             id += 1
             if parent_id is not None:
                 graph.edge(str(parent_id), str(node_id), constraint="false")
 
-            if len(node.children) != 0:
-                best_visit_count = max(
-                    [child.visit_count for child in node.children.values()]
-                )
+            if root.expanded(node):
+                children = root.children(node)
+                best_visit_count = root.visit_count[children].max()
             else:
+                children = []
                 best_visit_count = False
-            for action, child in node.children.items():
-                if child.visit_count != 0:
+            for child in children:
+                if root.visit_count[child] != 0:
                     traverse(
                         child,
-                        action,
+                        root.action[child],
+                        root.prior[node, root.action[child]],
                         node_id,
                         True
-                        if best_visit_count and child.visit_count == best_visit_count
+                        if best_visit_count
+                        and root.visit_count[child] == best_visit_count
                         else False,
                     )
 
-        traverse(root, None, None, True)
+        traverse(0, None, 0, None, True)
         graph.node(str(0), color="red")
         # print(graph.source)
         graph.render("mcts", view=plot, cleanup=True, format="pdf")
@@ -217,44 +220,32 @@ class Trajectoryinfo:
             self.action_history.append(action)
         if reward is not None:
             self.reward_history.append(reward)
-        self.prior_policies.append(
-            [
-                root.children[action].prior
-                if action in root.children.keys()
-                else numpy.NaN
-                for action in self.config.action_space
-            ]
+        # Statistics of the root children by action, NaN for the illegal actions
+        actions = root.actions(0)
+        children = root.children(0)
+        child_values = root.value_sum[children] / numpy.maximum(
+            root.visit_count[children], 1
         )
-        self.policies_after_planning.append(
-            [
-                root.children[action].visit_count / self.config.num_simulations
-                if action in root.children.keys()
-                else numpy.NaN
-                for action in self.config.action_space
-            ]
+        prior_policy, policy_after_planning, value_after_planning, prior_reward = (
+            numpy.full(len(self.config.action_space), numpy.nan) for _ in range(4)
         )
-        self.values_after_planning.append(
-            [
-                root.children[action].value()
-                if action in root.children.keys()
-                else numpy.NaN
-                for action in self.config.action_space
-            ]
+        prior_policy[actions] = root.prior[0, actions]
+        policy_after_planning[actions] = (
+            root.visit_count[children] / self.config.num_simulations
         )
+        value_after_planning[actions] = child_values
+        prior_reward[actions] = root.reward[children]
+
+        self.prior_policies.append(prior_policy.tolist())
+        self.policies_after_planning.append(policy_after_planning.tolist())
+        self.values_after_planning.append(value_after_planning.tolist())
         self.prior_root_value.append(
             mcts_info["root_predicted_value"]
             if not new_prior_root_value
             else new_prior_root_value
         )
         self.root_value_after_planning.append(root.value())
-        self.prior_rewards.append(
-            [
-                root.children[action].reward
-                if action in root.children.keys()
-                else numpy.NaN
-                for action in self.config.action_space
-            ]
-        )
+        self.prior_rewards.append(prior_reward.tolist())
         self.mcts_depth.append(mcts_info["max_tree_depth"])
 
     def plot_trajectory(self):
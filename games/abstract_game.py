@@ -1,5 +1,7 @@
 from abc import ABC, abstractmethod
 
+import numpy
+
 
 class AbstractGame(ABC):
     """
@@ -62,6 +64,27 @@ class AbstractGame(ABC):
         """
         pass
 
+    def time_remaining(self):
+        """
+        Return the time left on the game clock of the player to play, it is used to budget
+        the searches when search_time_fraction is set in the config.
+
+        Returns:
+            A number of seconds, or None if the game has no clock.
+        """
+        return None
+
+    def stats(self):
+        """
+        Return the statistics the game recorded since the last call and reset them, they are
+        forwarded to the shared storage and logged in TensorBoard by the self-play workers.
+
+        Returns:
+            A dict with the "timings" histograms in seconds over "bucket_edges", their
+            "totals" and the event "counters", or None if the game records none.
+        """
+        return None
+
     @abstractmethod
     def render(self):
         """
@@ -103,3 +126,218 @@ class AbstractGame(ABC):
             String representing the action.
         """
         return str(action_number)
+
+
+class AbstractVectorGame(ABC):
+    """
+    Optional interface to play a batch of games at once, the games advance together with
+    array operations instead of a loop over Game objects. Finished games are reset
+    automatically. VectorGameAdapter implements it for any Game class.
+    """
+
+    @abstractmethod
+    def __init__(self, num_games, seed=None):
+        pass
+
+    @abstractmethod
+    def step(self, actions):
+        """
+        Apply one action to each game, then reset the games which have ended.
+
+        Args:
+            actions : array of num_games actions of the action_space.
+
+        Returns:
+            The stacked new observations, with the initial observation of the new game for
+            the games which have ended, the array of rewards, the boolean array of the games
+            which have ended and the legal actions mask.
+        """
+        pass
+
+    @abstractmethod
+    def to_play(self):
+        """
+        Return the current player of each game.
+
+        Returns:
+            An array of num_games elements of the players list in the config.
+        """
+        pass
+
+    @abstractmethod
+    def legal_actions(self):
+        """
+        Return the legal actions of each game as a mask.
+
+        Returns:
+            A boolean array of shape (num_games, len(action_space)).
+        """
+        pass
+
+    @abstractmethod
+    def reset(self):
+        """
+        Reset all the games.
+
+        Returns:
+            The stacked initial observations.
+        """
+        pass
+
+    def close(self):
+        """
+        Properly close the games.
+        """
+        pass
+
+
+class VectorGameAdapter(AbstractVectorGame):
+    """
+    Batch of games of any Game class, stepped one after the other.
+    """
+
+    def __init__(self, Game, num_games, action_space_size, seed=None):
+        self.games = [
+            Game(seed + i if seed is not None else None) for i in range(num_games)
+        ]
+        self.action_space_size = action_space_size
+
+    def step(self, actions):
+        observations, rewards, dones = [], [], []
+        for game, action in zip(self.games, actions):
+            observation, reward, done = game.step(int(action))
+            if done:
+                observation = game.reset()
+            observations.append(observation)
+            rewards.append(reward)
+            dones.append(done)
+        return (
+            numpy.array(observations),
+            numpy.array(rewards, dtype="float64"),
+            numpy.array(dones, dtype="bool"),
+            self.legal_actions(),
+        )
+
+    def to_play(self):
+        return numpy.array([game.to_play() for game in self.games])
+
+    def legal_actions(self):
+        legal_actions = numpy.zeros(
+            (len(self.games), self.action_space_size), dtype="bool"
+        )
+        for i, game in enumerate(self.games):
+            legal_actions[i, game.legal_actions()] = True
+        return legal_actions
+
+    def reset(self):
+        return numpy.array([game.reset() for game in self.games])
+
+    def close(self):
+        for game in self.games:
+            game.close()
+
+
+class BoardVectorGame(AbstractVectorGame):
+    """
+    Batch of two-player games where the players put stones on a board in turn until one
+    of them aligns win_length stones, like tictactoe, connect4 or gomoku. The boards are
+    stored in a single array and every step is a handful of array operations for the
+    whole batch. Subclasses set the rules below.
+    """
+
+    board_shape = None
+    win_length = None
+    # The stones fall to the lowest empty row of the column given by the action
+    gravity = False
+    win_reward = 1
+    draw_reward = 0
+    observation_dtype = "float64"
+
+    def __init__(self, num_games, seed=None):
+        self.num_games = num_games
+        self.batch_index = numpy.arange(num_games)
+        self.board = numpy.zeros((num_games, *self.board_shape), dtype="int32")
+        # 1 for the first player, -1 for the second one
+        self.player = numpy.ones(num_games, dtype="int32")
+        # Number of stones in each column, used with gravity
+        self.heights = numpy.zeros((num_games, self.board_shape[1]), dtype="int32")
+        self.num_moves = numpy.zeros(num_games, dtype="int32")
+
+    def step(self, actions):
+        actions = numpy.asarray(actions)
+        if self.gravity:
+            cols = actions
+            rows = self.heights[self.batch_index, cols]
+            self.heights[self.batch_index, cols] += 1
+        else:
+            rows, cols = numpy.divmod(actions, self.board_shape[1])
+        self.board[self.batch_index, rows, cols] = self.player
+        self.num_moves += 1
+
+        wins = self.aligned(rows, cols)
+        draws = ~wins & (self.num_moves == self.board.shape[1] * self.board.shape[2])
+        rewards = numpy.where(wins, self.win_reward, 0) + numpy.where(
+            draws, self.draw_reward, 0
+        )
+        dones = wins | draws
+
+        self.player *= -1
+        self.reset_games(dones)
+        return (
+            self.get_observation(),
+            rewards.astype("float64"),
+            dones,
+            self.legal_actions(),
+        )
+
+    def aligned(self, rows, cols):
+        """
+        Return whether the last stones, at rows and cols, complete a line of win_length
+        stones. Only the lines through the last stones are checked.
+        """
+        num_rows, num_cols = self.board_shape
+        lengths = numpy.ones((4, self.num_games), dtype="int32")
+        for i, (d_row, d_col) in enumerate(((0, 1), (1, 0), (1, 1), (1, -1))):
+            for sign in (1, -1):
+                aligned = numpy.ones(self.num_games, dtype="bool")
+                for k in range(1, self.win_length):
+                    row = rows + sign * k * d_row
+                    col = cols + sign * k * d_col
+                    inside = (
+                        (0 <= row) & (row < num_rows) & (0 <= col) & (col < num_cols)
+                    )
+                    aligned &= inside
+                    aligned[aligned] = (
+                        self.board[
+                            self.batch_index[aligned], row[aligned], col[aligned]
+                        ]
+                        == self.player[aligned]
+                    )
+                    lengths[i] += aligned
+        return (self.win_length <= lengths).any(axis=0)
+
+    def reset_games(self, games):
+        self.board[games] = 0
+        self.player[games] = 1
+        self.heights[games] = 0
+        self.num_moves[games] = 0
+
+    def get_observation(self):
+        board_player1 = self.board == 1
+        board_player2 = self.board == -1
+        board_to_play = numpy.broadcast_to(self.player[:, None, None], self.board.shape)
+        return numpy.stack(
+            [board_player1, board_player2, board_to_play], axis=1
+        ).astype(self.observation_dtype)
+
+    def to_play(self):
+        return numpy.where(self.player == 1, 0, 1)
+
+    def legal_actions(self):
+        if self.gravity:
+            return self.heights < self.board_shape[0]
+        return (self.board == 0).reshape(self.num_games, -1)
+
+    def reset(self):
+        self.reset_games(slice(None))
+        return self.get_observation()
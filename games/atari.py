@@ -37,11 +37,29 @@ class MuZeroConfig:
 
         ### Self-Play
         self.num_workers = 350  # Number of simultaneous threads/workers self-playing to feed the replay buffer
+        self.games_per_worker = 1  # Number of games played in lockstep by each worker. Their searches are batched together so every simulation evaluates all the games in a single network call
         self.selfplay_on_gpu = False
+        self.use_inference_server = False  # Evaluate the network of all the self-play workers in a single InferenceServer actor which batches their requests. The weights are then stored and refreshed only in the server
+        self.inference_max_batch_size = 256  # Maximum number of positions evaluated by the inference server in one network call
+        self.inference_max_wait_us = 500  # Maximum time in microseconds the inference server waits to fill a batch after its first request
         self.max_moves = 27000  # Maximum number of moves if game is not finished before
         self.num_simulations = 50  # Number of future moves self-simulated
+        self.search_time_budget = None  # Maximum number of seconds spent in each search, it then stops before num_simulations. None to always run num_simulations
+        self.search_time_fraction = None  # Fraction of the remaining game clock (Game.time_remaining) spent in each search when it is shorter than search_time_budget. None to ignore the game clock
+        self.leaf_batch_size = 1  # Number of leaves selected with a virtual loss in each tree per round of simulations. They are evaluated together in one batched call of the dynamics function
+        self.reuse_tree = False  # Keep the subtree of the played action as the root of the next search, its Dirichlet noise is drawn again
+        self.reuse_tree_max_visits = None  # Maximum number of visits carried over at the root of a reused subtree, the visit counts are scaled down above it. None to keep them all
+        self.stop_when_decided = False  # Stop the search once the most visited root action can not be overtaken by the remaining simulations
+        self.visit_convergence_tolerance = None  # Stop the search once the root visit distribution moved less than this L1 distance between two checks. None to disable
+        self.visit_convergence_interval = 10  # Number of simulations between two checks of the root visit distribution
+        self.fast_num_simulations = None  # Playout cap randomization: number of simulations of the fast searches of the training games, their moves are not used as policy targets. None to always run num_simulations
+        self.full_search_probability = 0.25  # Probability for a move of a training game to run a full search of num_simulations when fast_num_simulations is set
         self.discount = 0.997  # Chronological discount of the reward
         self.temperature_threshold = None  # Number of moves before dropping the temperature given by visit_softmax_temperature_fn to 0 (ie selecting the best action). If None, visit_softmax_temperature_fn is used every time
+        self.profile_mcts = False  # Record the time spent in each phase of the searches and the sizes and depths of the search trees, logged in TensorBoard
+        self.resign_threshold = None  # Root value under which the player to play resigns in the two-player self-play games. None to always play the games to the end
+        self.resign_playout_fraction = 0.1  # Fraction of the games played to the end anyway to measure the false resignations
+        self.resign_false_positive_rate = 0.05  # The resign threshold is tuned to keep the fraction of the played out games which would have been resigned without being lost under it. None to keep resign_threshold
 
         # Root prior exploration noise
         self.root_dirichlet_alpha = 0.25
@@ -51,6 +69,12 @@ class MuZeroConfig:
         self.pb_c_base = 19652
         self.pb_c_init = 1.25
 
+        # Gumbel root search (See paper Policy improvement by planning with Gumbel)
+        self.use_gumbel = False  # Replace the Dirichlet noise and the pUCT selection at the root by a Gumbel-top-k sampling of actions searched with sequential halving. The policy targets become the improved policy
+        self.gumbel_max_considered_actions = 16  # Number of actions sampled at the root and searched with sequential halving
+        self.gumbel_c_visit = 50  # Scale of the completed Q-values in the improved policy: (gumbel_c_visit + max visit count) * gumbel_c_scale
+        self.gumbel_c_scale = 0.1
+
 
 
         ### Network
@@ -4,7 +4,7 @@ import pathlib
 import numpy
 import torch
 
-from .abstract_game import AbstractGame
+from .abstract_game import AbstractGame, BoardVectorGame
 
 
 class MuZeroConfig:
@@ -31,11 +31,29 @@ class MuZeroConfig:
 
         ### Self-Play
         self.num_workers = 1  # Number of simultaneous threads/workers self-playing to feed the replay buffer
+        self.games_per_worker = 1  # Number of games played in lockstep by each worker. Their searches are batched together so every simulation evaluates all the games in a single network call
         self.selfplay_on_gpu = False
+        self.use_inference_server = False  # Evaluate the network of all the self-play workers in a single InferenceServer actor which batches their requests. The weights are then stored and refreshed only in the server
+        self.inference_max_batch_size = 256  # Maximum number of positions evaluated by the inference server in one network call
+        self.inference_max_wait_us = 500  # Maximum time in microseconds the inference server waits to fill a batch after its first request
         self.max_moves = 42  # Maximum number of moves if game is not finished before
         self.num_simulations = 200  # Number of future moves self-simulated
+        self.search_time_budget = None  # Maximum number of seconds spent in each search, it then stops before num_simulations. None to always run num_simulations
+        self.search_time_fraction = None  # Fraction of the remaining game clock (Game.time_remaining) spent in each search when it is shorter than search_time_budget. None to ignore the game clock
+        self.leaf_batch_size = 1  # Number of leaves selected with a virtual loss in each tree per round of simulations. They are evaluated together in one batched call of the dynamics function
+        self.reuse_tree = False  # Keep the subtree of the played action as the root of the next search, its Dirichlet noise is drawn again
+        self.reuse_tree_max_visits = None  # Maximum number of visits carried over at the root of a reused subtree, the visit counts are scaled down above it. None to keep them all
+        self.stop_when_decided = False  # Stop the search once the most visited root action can not be overtaken by the remaining simulations
+        self.visit_convergence_tolerance = None  # Stop the search once the root visit distribution moved less than this L1 distance between two checks. None to disable
+        self.visit_convergence_interval = 10  # Number of simulations between two checks of the root visit distribution
+        self.fast_num_simulations = None  # Playout cap randomization: number of simulations of the fast searches of the training games, their moves are not used as policy targets. None to always run num_simulations
+        self.full_search_probability = 0.25  # Probability for a move of a training game to run a full search of num_simulations when fast_num_simulations is set
         self.discount = 1  # Chronological discount of the reward
         self.temperature_threshold = None  # Number of moves before dropping the temperature given by visit_softmax_temperature_fn to 0 (ie selecting the best action). If None, visit_softmax_temperature_fn is used every time
+        self.profile_mcts = False  # Record the time spent in each phase of the searches and the sizes and depths of the search trees, logged in TensorBoard
+        self.resign_threshold = None  # Root value under which the player to play resigns in the two-player self-play games. None to always play the games to the end
+        self.resign_playout_fraction = 0.1  # Fraction of the games played to the end anyway to measure the false resignations
+        self.resign_false_positive_rate = 0.05  # The resign threshold is tuned to keep the fraction of the played out games which would have been resigned without being lost under it. None to keep resign_threshold
 
         # Root prior exploration noise
         self.root_dirichlet_alpha = 0.3
@@ -45,6 +63,12 @@ class MuZeroConfig:
         self.pb_c_base = 19652
         self.pb_c_init = 1.25
 
+        # Gumbel root search (See paper Policy improvement by planning with Gumbel)
+        self.use_gumbel = False  # Replace the Dirichlet noise and the pUCT selection at the root by a Gumbel-top-k sampling of actions searched with sequential halving. The policy targets become the improved policy
+        self.gumbel_max_considered_actions = 16  # Number of actions sampled at the root and searched with sequential halving
+        self.gumbel_c_visit = 50  # Scale of the completed Q-values in the improved policy: (gumbel_c_visit + max visit count) * gumbel_c_scale
+        self.gumbel_c_scale = 0.1
+
 
 
         ### Network
@@ -217,10 +241,38 @@ class Game(AbstractGame):
         return f"Play column {action_number + 1}"
 
 
+class VectorGame(BoardVectorGame):
+    """
+    Batch of connect4 games advanced together with numpy array operations.
+    """
+
+    board_shape = (6, 7)
+    win_length = 4
+    gravity = True
+    win_reward = 10
+
+
 class Connect4:
+    """
+    Connect4 on bitboards. The stones of each player are the bits of an integer, the
+    column c uses the bits c * 7 to c * 7 + 5 from the bottom to the top, the bit c * 7 + 6
+    stays empty so that the lines do not wrap from a column to the next.
+    """
+
+    # Bits of the bottom cell of every column and of every cell of the board
+    bottom_mask = sum(1 << (col * 7) for col in range(7))
+    board_mask = bottom_mask * ((1 << 6) - 1)
+
     def __init__(self):
         self.board = numpy.zeros((6, 7), dtype="int32")
         self.player = 1
+        # Stones of the first and of the second player
+        self.bitboards = [0, 0]
+        # Number of stones in each column
+        self.heights = [0] * 7
+        # Planes of the observation, updated with each stone
+        self.observation = numpy.zeros((3, 6, 7))
+        self.observation[2] = self.player
 
     def to_play(self):
         return 0 if self.player == 1 else 1
@@ -228,119 +280,76 @@ class Connect4:
     def reset(self):
         self.board = numpy.zeros((6, 7), dtype="int32")
         self.player = 1
+        self.bitboards = [0, 0]
+        self.heights = [0] * 7
+        self.observation = numpy.zeros((3, 6, 7))
+        self.observation[2] = self.player
         return self.get_observation()
 
     def step(self, action):
-        for i in range(6):
-            if self.board[i][action] == 0:
-                self.board[i][action] = self.player
-                break
+        # The search gives numpy integers, the bitboards must stay Python integers
+        action = int(action)
+        row = self.heights[action]
+        self.board[row][action] = self.player
+        self.bitboards[self.to_play()] |= 1 << (action * 7 + row)
+        self.heights[action] += 1
+        self.observation[self.to_play(), row, action] = 1.0
 
-        done = self.have_winner() or len(self.legal_actions()) == 0
+        winner = self.have_winner()
+        done = winner or len(self.legal_actions()) == 0
 
-        reward = 1 if self.have_winner() else 0
+        reward = 1 if winner else 0
 
         self.player *= -1
+        self.observation[2] = self.player
 
         return self.get_observation(), reward, done
 
     def get_observation(self):
-        board_player1 = numpy.where(self.board == 1, 1.0, 0.0)
-        board_player2 = numpy.where(self.board == -1, 1.0, 0.0)
-        board_to_play = numpy.full((6, 7), self.player, dtype="int32")
-        return numpy.array([board_player1, board_player2, board_to_play])
+        return self.observation.copy()
 
     def legal_actions(self):
-        legal = []
-        for i in range(7):
-            if self.board[5][i] == 0:
-                legal.append(i)
-        return legal
+        return [col for col in range(7) if self.heights[col] < 6]
 
     def have_winner(self):
-        # Horizontal check
-        for i in range(4):
-            for j in range(6):
-                if (
-                    self.board[j][i] == self.player
-                    and self.board[j][i + 1] == self.player
-                    and self.board[j][i + 2] == self.player
-                    and self.board[j][i + 3] == self.player
-                ):
-                    return True
-
-        # Vertical check
-        for i in range(7):
-            for j in range(3):
-                if (
-                    self.board[j][i] == self.player
-                    and self.board[j + 1][i] == self.player
-                    and self.board[j + 2][i] == self.player
-                    and self.board[j + 3][i] == self.player
-                ):
-                    return True
-
-        # Positive diagonal check
-        for i in range(4):
-            for j in range(3):
-                if (
-                    self.board[j][i] == self.player
-                    and self.board[j + 1][i + 1] == self.player
-                    and self.board[j + 2][i + 2] == self.player
-                    and self.board[j + 3][i + 3] == self.player
-                ):
-                    return True
-
-        # Negative diagonal check
-        for i in range(4):
-            for j in range(3, 6):
-                if (
-                    self.board[j][i] == self.player
-                    and self.board[j - 1][i + 1] == self.player
-                    and self.board[j - 2][i + 2] == self.player
-                    and self.board[j - 3][i + 3] == self.player
-                ):
-                    return True
-
+        # Only the player who just played can have aligned four stones
+        bitboard = self.bitboards[self.to_play()]
+        # Vertical, horizontal and the two diagonal directions
+        for shift in (1, 7, 6, 8):
+            pairs = bitboard & (bitboard >> shift)
+            if pairs & (pairs >> (2 * shift)):
+                return True
         return False
 
+    def winning_cells(self, bitboard):
+        """
+        Return the empty cells which would complete a line of four stones of bitboard.
+        """
+        # Vertical
+        cells = (bitboard << 1) & (bitboard << 2) & (bitboard << 3)
+        # Horizontal and diagonals, the empty cell can be at any place of the line
+        for shift in (7, 6, 8):
+            pairs = (bitboard << shift) & (bitboard << (2 * shift))
+            cells |= pairs & (bitboard << (3 * shift))
+            cells |= pairs & (bitboard >> shift)
+            pairs = (bitboard >> shift) & (bitboard >> (2 * shift))
+            cells |= pairs & (bitboard << shift)
+            cells |= pairs & (bitboard >> (3 * shift))
+        return cells & (self.board_mask ^ (self.bitboards[0] | self.bitboards[1]))
+
     def expert_action(self):
-        board = self.board
-        action = numpy.random.choice(self.legal_actions())
-        for k in range(3):
-            for l in range(4):
-                sub_board = board[k : k + 4, l : l + 4]
-                # Horizontal and vertical checks
-                for i in range(4):
-                    if abs(sum(sub_board[i, :])) == 3:
-                        ind = numpy.where(sub_board[i, :] == 0)[0][0]
-                        if numpy.count_nonzero(board[:, ind + l]) == i + k:
-                            action = ind + l
-                            if self.player * sum(sub_board[i, :]) > 0:
-                                return action
-
-                    if abs(sum(sub_board[:, i])) == 3:
-                        action = i + l
-                        if self.player * sum(sub_board[:, i]) > 0:
-                            return action
-                # Diagonal checks
-                diag = sub_board.diagonal()
-                anti_diag = numpy.fliplr(sub_board).diagonal()
-                if abs(sum(diag)) == 3:
-                    ind = numpy.where(diag == 0)[0][0]
-                    if numpy.count_nonzero(board[:, ind + l]) == ind + k:
-                        action = ind + l
-                        if self.player * sum(diag) > 0:
-                            return action
-
-                if abs(sum(anti_diag)) == 3:
-                    ind = numpy.where(anti_diag == 0)[0][0]
-                    if numpy.count_nonzero(board[:, 3 - ind + l]) == ind + k:
-                        action = 3 - ind + l
-                        if self.player * sum(anti_diag) > 0:
-                            return action
-
-        return action
+        # Win if possible, otherwise block a win of the opponent
+        playable = ((self.bitboards[0] | self.bitboards[1]) + self.bottom_mask) & (
+            self.board_mask
+        )
+        for bitboard in (
+            self.bitboards[self.to_play()],
+            self.bitboards[1 - self.to_play()],
+        ):
+            cells = self.winning_cells(bitboard) & playable
+            if cells:
+                return (cells.bit_length() - 1) // 7
+        return numpy.random.choice(self.legal_actions())
 
     def render(self):
         print(self.board[::-1])
@@ -1,3 +1,4 @@
+import bisect
 import datetime
 import math
 import pathlib
@@ -5,7 +6,10 @@ import pathlib
 import numpy
 import torch
 
-from .abstract_game import AbstractGame
+from .abstract_game import AbstractGame, BoardVectorGame
+
+# Size of the side of the board, 15 and 19 are the usual sizes
+BOARD_SIZE = 11
 
 
 class MuZeroConfig:
@@ -19,8 +23,8 @@ class MuZeroConfig:
 
 
         ### Game
-        self.observation_shape = (3, 11, 11)  # Dimensions of the game observation, must be 3 (channel, height, width). For a 1D array, please reshape it to (1, 1, length of array)
-        self.action_space = list(range(11 * 11))  # Fixed list of all possible actions. You should only edit the length
+        self.observation_shape = (3, BOARD_SIZE, BOARD_SIZE)  # Dimensions of the game observation, must be 3 (channel, height, width). For a 1D array, please reshape it to (1, 1, length of array)
+        self.action_space = list(range(BOARD_SIZE * BOARD_SIZE))  # Fixed list of all possible actions. You should only edit the length
         self.players = list(range(2))  # List of players. You should only edit the length
         self.stacked_observations = 0  # Number of previous observations and previous actions to add to the current observation
 
@@ -32,11 +36,29 @@ class MuZeroConfig:
 
         ### Self-Play
         self.num_workers = 2  # Number of simultaneous threads/workers self-playing to feed the replay buffer
+        self.games_per_worker = 1  # Number of games played in lockstep by each worker. Their searches are batched together so every simulation evaluates all the games in a single network call
         self.selfplay_on_gpu = False
-        self.max_moves = 121  # Maximum number of moves if game is not finished before
+        self.use_inference_server = False  # Evaluate the network of all the self-play workers in a single InferenceServer actor which batches their requests. The weights are then stored and refreshed only in the server
+        self.inference_max_batch_size = 256  # Maximum number of positions evaluated by the inference server in one network call
+        self.inference_max_wait_us = 500  # Maximum time in microseconds the inference server waits to fill a batch after its first request
+        self.max_moves = BOARD_SIZE * BOARD_SIZE  # Maximum number of moves if game is not finished before
         self.num_simulations = 400  # Number of future moves self-simulated
+        self.search_time_budget = None  # Maximum number of seconds spent in each search, it then stops before num_simulations. None to always run num_simulations
+        self.search_time_fraction = None  # Fraction of the remaining game clock (Game.time_remaining) spent in each search when it is shorter than search_time_budget. None to ignore the game clock
+        self.leaf_batch_size = 1  # Number of leaves selected with a virtual loss in each tree per round of simulations. They are evaluated together in one batched call of the dynamics function
+        self.reuse_tree = False  # Keep the subtree of the played action as the root of the next search, its Dirichlet noise is drawn again
+        self.reuse_tree_max_visits = None  # Maximum number of visits carried over at the root of a reused subtree, the visit counts are scaled down above it. None to keep them all
+        self.stop_when_decided = False  # Stop the search once the most visited root action can not be overtaken by the remaining simulations
+        self.visit_convergence_tolerance = None  # Stop the search once the root visit distribution moved less than this L1 distance between two checks. None to disable
+        self.visit_convergence_interval = 10  # Number of simulations between two checks of the root visit distribution
+        self.fast_num_simulations = None  # Playout cap randomization: number of simulations of the fast searches of the training games, their moves are not used as policy targets. None to always run num_simulations
+        self.full_search_probability = 0.25  # Probability for a move of a training game to run a full search of num_simulations when fast_num_simulations is set
         self.discount = 1  # Chronological discount of the reward
         self.temperature_threshold = None  # Number of moves before dropping the temperature given by visit_softmax_temperature_fn to 0 (ie selecting the best action). If None, visit_softmax_temperature_fn is used every time
+        self.profile_mcts = False  # Record the time spent in each phase of the searches and the sizes and depths of the search trees, logged in TensorBoard
+        self.resign_threshold = None  # Root value under which the player to play resigns in the two-player self-play games. None to always play the games to the end
+        self.resign_playout_fraction = 0.1  # Fraction of the games played to the end anyway to measure the false resignations
+        self.resign_false_positive_rate = 0.05  # The resign threshold is tuned to keep the fraction of the played out games which would have been resigned without being lost under it. None to keep resign_threshold
 
         # Root prior exploration noise
         self.root_dirichlet_alpha = 0.3
@@ -46,6 +68,12 @@ class MuZeroConfig:
         self.pb_c_base = 19652
         self.pb_c_init = 1.25
 
+        # Gumbel root search (See paper Policy improvement by planning with Gumbel)
+        self.use_gumbel = False  # Replace the Dirichlet noise and the pUCT selection at the root by a Gumbel-top-k sampling of actions searched with sequential halving. The policy targets become the improved policy
+        self.gumbel_max_considered_actions = 16  # Number of actions sampled at the root and searched with sequential halving
+        self.gumbel_c_visit = 50  # Scale of the completed Q-values in the improved policy: (gumbel_c_visit + max visit count) * gumbel_c_scale
+        self.gumbel_c_scale = 0.1
+
 
 
         ### Network
@@ -95,8 +123,8 @@ class MuZeroConfig:
 
         ### Replay Buffer
         self.replay_buffer_size = 10000  # Number of self-play games to keep in the replay buffer
-        self.num_unroll_steps = 121  # Number of game moves to keep for every batch element
-        self.td_steps = 121  # Number of steps in the future to take into account for calculating the target value
+        self.num_unroll_steps = BOARD_SIZE * BOARD_SIZE  # Number of game moves to keep for every batch element
+        self.td_steps = BOARD_SIZE * BOARD_SIZE  # Number of steps in the future to take into account for calculating the target value
         self.PER = True  # Prioritized Replay (See paper appendix Training), select in priority the elements in the replay buffer which are unexpected for the network
         self.PER_alpha = 0.5  # How much prioritization is used, 0 corresponding to the uniform case, paper suggests 1
 
@@ -134,7 +162,7 @@ class Game(AbstractGame):
     """
 
     def __init__(self, seed=None):
-        self.env = Gomoku()
+        self.env = Gomoku(BOARD_SIZE)
 
     def step(self, action):
         """
@@ -217,14 +245,24 @@ class Game(AbstractGame):
         return self.env.action_to_human_input(action)
 
 
+class VectorGame(BoardVectorGame):
+    """
+    Batch of gomoku games advanced together with numpy array operations.
+    """
+
+    board_shape = (BOARD_SIZE, BOARD_SIZE)
+    win_length = 5
+    # A full board also ends the game with a reward
+    draw_reward = 1
+
+
 class Gomoku:
-    def __init__(self):
-        self.board_size = 11
-        self.board = numpy.zeros((self.board_size, self.board_size), dtype="int32")
-        self.player = 1
+    def __init__(self, board_size=BOARD_SIZE):
+        self.board_size = board_size
         self.board_markers = [
             chr(x) for x in range(ord("A"), ord("A") + self.board_size)
         ]
+        self.reset()
 
     def to_play(self):
         return 0 if self.player == 1 else 1
@@ -232,64 +270,60 @@ class Gomoku:
     def reset(self):
         self.board = numpy.zeros((self.board_size, self.board_size), dtype="int32")
         self.player = 1
+        # Sorted actions of the empty cells
+        self.empty_cells = list(range(self.board_size * self.board_size))
+        self.last_move = None
+        # Planes of the observation, updated with each stone
+        self.observation = numpy.zeros((3, self.board_size, self.board_size))
+        self.observation[2] = self.player
         return self.get_observation()
 
     def step(self, action):
         x = math.floor(action / self.board_size)
         y = action % self.board_size
         self.board[x][y] = self.player
+        del self.empty_cells[bisect.bisect_left(self.empty_cells, action)]
+        self.last_move = (x, y)
+        self.observation[self.to_play(), x, y] = 1.0
 
         done = self.is_finished()
 
         reward = 1 if done else 0
 
         self.player *= -1
+        self.observation[2] = self.player
 
         return self.get_observation(), reward, done
 
     def get_observation(self):
-        board_player1 = numpy.where(self.board == 1, 1.0, 0.0)
-        board_player2 = numpy.where(self.board == -1, 1.0, 0.0)
-        board_to_play = numpy.full((11, 11), self.player, dtype="int32")
-        return numpy.array([board_player1, board_player2, board_to_play])
+        return self.observation.copy()
 
     def legal_actions(self):
-        legal = []
-        for i in range(self.board_size):
-            for j in range(self.board_size):
-                if self.board[i][j] == 0:
-                    legal.append(i * self.board_size + j)
-        return legal
+        return list(self.empty_cells)
 
     def is_finished(self):
-        has_legal_actions = False
-        directions = ((1, -1), (1, 0), (1, 1), (0, 1))
-        for i in range(self.board_size):
-            for j in range(self.board_size):
-                # if no stone is on the position, don't need to consider this position
-                if self.board[i][j] == 0:
-                    has_legal_actions = True
-                    continue
-                # value-value at a coord, i-row, j-col
-                player = self.board[i][j]
-                # check if there exist 5 in a line
-                for d in directions:
-                    x, y = i, j
-                    count = 0
-                    for _ in range(5):
-                        if (x not in range(self.board_size)) or (
-                            y not in range(self.board_size)
-                        ):
-                            break
-                        if self.board[x][y] != player:
-                            break
-                        x += d[0]
-                        y += d[1]
-                        count += 1
-                        # if 5 in a line, store positions of all stones, return value
-                        if count == 5:
-                            return True
-        return not has_legal_actions
+        if not self.empty_cells:
+            return True
+        if self.last_move is None:
+            return False
+        # Only the lines through the last stone can have become 5 in a row
+        i, j = self.last_move
+        player = self.board[i][j]
+        for d_x, d_y in ((1, -1), (1, 0), (1, 1), (0, 1)):
+            count = 1
+            for sign in (1, -1):
+                x, y = i + sign * d_x, j + sign * d_y
+                while (
+                    0 <= x < self.board_size
+                    and 0 <= y < self.board_size
+                    and self.board[x][y] == player
+                ):
+                    count += 1
+                    x += sign * d_x
+                    y += sign * d_y
+            if 5 <= count:
+                return True
+        return False
 
     def render(self):
         marker = "  "
@@ -0,0 +1,176 @@
+"""
+Lookup-table poker hand evaluator and Monte Carlo equity estimator.
+Hands of 5 to 7 cards are ranked through tables indexed by 13-bit rank masks, vectorized over many hands.
+
+Cards are the 0-51 indices of CARD_INDEX: rank * 4 + suit.
+Hand values are integers, a higher value is a better hand:
+    category << 20 | ranks deciding the hand within its category, in 4-bit groups from the most significant
+"""
+
+from typing import List, Optional
+
+import numpy as np
+
+from .poker_socket import CARD_INDEX
+
+
+HIGH_CARD, PAIR, TWO_PAIR, THREE_OF_A_KIND, STRAIGHT, FLUSH, FULL_HOUSE, FOUR_OF_A_KIND, STRAIGHT_FLUSH = range(9)
+CATEGORY_SHIFT = 20
+
+NUM_MASKS = 1 << 13
+
+
+def _build_tables():
+    """Tables indexed by rank masks: highest straight, highest rank and the highest ranks packed in 4-bit groups."""
+    straight_high = np.full(NUM_MASKS, -1, dtype=np.int32)
+    highest_rank = np.full(NUM_MASKS, -1, dtype=np.int32)
+    top_ranks = np.zeros((6, NUM_MASKS), dtype=np.int32)
+    straights = [(high, sum(1 << (high - i) for i in range(5))) for high in range(12, 3, -1)]
+    straights.append((3, 0b1000000001111))  # The wheel, A-2-3-4-5
+    for mask in range(NUM_MASKS):
+        ranks = [rank for rank in range(12, -1, -1) if mask >> rank & 1]
+        if ranks:
+            highest_rank[mask] = ranks[0]
+        for count in range(1, 6):
+            packed = 0
+            for rank in ranks[:count]:
+                packed = packed << 4 | rank
+            # Missing ranks leave zeros in the low groups so that the groups keep their weight
+            top_ranks[count, mask] = packed << 4 * (count - min(count, len(ranks)))
+        for high, straight in straights:
+            if mask & straight == straight:
+                straight_high[mask] = high
+                break
+    return straight_high, highest_rank, top_ranks
+
+
+STRAIGHT_HIGH, HIGHEST_RANK, TOP_RANKS = _build_tables()
+RANK_BITS = (1 << np.arange(13, dtype=np.int32))
+# The same tables as lists, indexing them is faster for single hands
+_STRAIGHT_HIGH, _HIGHEST_RANK, _TOP_RANKS = STRAIGHT_HIGH.tolist(), HIGHEST_RANK.tolist(), TOP_RANKS.tolist()
+_BIT_COUNTS = [bin(mask).count('1') for mask in range(NUM_MASKS)]
+
+
+def cards_to_indices(cards: List[str]) -> np.ndarray:
+    """Convert card strings to 0-51 indices."""
+    return np.array([CARD_INDEX[card] for card in cards], dtype=np.int32)
+
+
+def evaluate_hands(cards: np.ndarray) -> np.ndarray:
+    """Return the value of each row of an (N, 5 to 7) array of card indices."""
+    cards = np.asarray(cards, dtype=np.int32)
+    ranks = cards >> 2
+    suits = cards & 3
+    rows = np.arange(len(cards))
+    
+    # Number of cards of each rank and the masks of ranks held at least once, twice, three and four times
+    rank_counts = (ranks[:, :, None] == np.arange(13)).sum(axis=1)
+    count_masks = [(rank_counts >= count) @ RANK_BITS for count in range(1, 5)]
+    rank_mask, pair_mask, trips_mask, quads_mask = count_masks
+    
+    # Ranks of the most frequent suit, a flush when it has 5 cards or more
+    suit_counts = (suits[:, :, None] == np.arange(4)).sum(axis=1)
+    flush_suit = suit_counts.argmax(axis=1)
+    is_flush = suit_counts[rows, flush_suit] >= 5
+    flush_mask = np.bitwise_or.reduce(np.where(suits == flush_suit[:, None], 1 << ranks, 0), axis=1)
+    
+    # Highest rank held four, three and two times, -1 when there is none, and the masks without them
+    quads = HIGHEST_RANK[quads_mask]
+    trips = HIGHEST_RANK[trips_mask]
+    pair = HIGHEST_RANK[pair_mask]
+    without_quads = rank_mask & ~(1 << np.maximum(quads, 0))
+    without_trips = rank_mask & ~(1 << np.maximum(trips, 0))
+    without_pair = rank_mask & ~(1 << np.maximum(pair, 0))
+    # The pair of a full house may be a second three of a kind
+    full_house_pair = HIGHEST_RANK[pair_mask & without_trips]
+    second_pair = HIGHEST_RANK[pair_mask & without_pair]
+    without_pairs = without_pair & ~(1 << np.maximum(second_pair, 0))
+    straight_flush = STRAIGHT_HIGH[flush_mask]
+    straight = STRAIGHT_HIGH[rank_mask]
+    
+    conditions = [
+        is_flush & (straight_flush >= 0),
+        quads >= 0,
+        (trips >= 0) & (full_house_pair >= 0),
+        is_flush,
+        straight >= 0,
+        trips >= 0,
+        second_pair >= 0,
+        pair >= 0,
+    ]
+    values = [
+        STRAIGHT_FLUSH << CATEGORY_SHIFT | straight_flush << 16,
+        FOUR_OF_A_KIND << CATEGORY_SHIFT | quads << 16 | TOP_RANKS[1, without_quads] << 12,
+        FULL_HOUSE << CATEGORY_SHIFT | trips << 16 | full_house_pair << 12,
+        FLUSH << CATEGORY_SHIFT | TOP_RANKS[5, flush_mask],
+        STRAIGHT << CATEGORY_SHIFT | straight << 16,
+        THREE_OF_A_KIND << CATEGORY_SHIFT | trips << 16 | TOP_RANKS[2, without_trips] << 8,
+        TWO_PAIR << CATEGORY_SHIFT | pair << 16 | second_pair << 12 | TOP_RANKS[1, without_pairs] << 8,
+        PAIR << CATEGORY_SHIFT | pair << 16 | TOP_RANKS[3, without_pair] << 4,
+    ]
+    return np.select(conditions, values, default=HIGH_CARD << CATEGORY_SHIFT | TOP_RANKS[5, rank_mask])
+
+
+def evaluate(cards: List[str]) -> int:
+    """Return the value of a hand of 5 to 7 card strings, the same as evaluate_hands without numpy overhead."""
+    rank_counts = [0] * 13
+    suit_masks = [0, 0, 0, 0]
+    for card in cards:
+        index = CARD_INDEX[card]
+        rank_counts[index >> 2] += 1
+        suit_masks[index & 3] |= 1 << (index >> 2)
+    count_masks = [0, 0, 0, 0, 0]
+    for rank, count in enumerate(rank_counts):
+        for times in range(1, count + 1):
+            count_masks[times] |= 1 << rank
+    _, rank_mask, pair_mask, trips_mask, quads_mask = count_masks
+    flush_mask = max(suit_masks, key=_BIT_COUNTS.__getitem__)
+    is_flush = _BIT_COUNTS[flush_mask] >= 5
+    
+    if is_flush and _STRAIGHT_HIGH[flush_mask] >= 0:
+        return STRAIGHT_FLUSH << CATEGORY_SHIFT | _STRAIGHT_HIGH[flush_mask] << 16
+    quads = _HIGHEST_RANK[quads_mask]
+    if quads >= 0:
+        return FOUR_OF_A_KIND << CATEGORY_SHIFT | quads << 16 | _TOP_RANKS[1][rank_mask & ~(1 << quads)] << 12
+    trips = _HIGHEST_RANK[trips_mask]
+    if trips >= 0 and _HIGHEST_RANK[pair_mask & ~(1 << trips)] >= 0:
+        return FULL_HOUSE << CATEGORY_SHIFT | trips << 16 | _HIGHEST_RANK[pair_mask & ~(1 << trips)] << 12
+    if is_flush:
+        return FLUSH << CATEGORY_SHIFT | _TOP_RANKS[5][flush_mask]
+    if _STRAIGHT_HIGH[rank_mask] >= 0:
+        return STRAIGHT << CATEGORY_SHIFT | _STRAIGHT_HIGH[rank_mask] << 16
+    if trips >= 0:
+        return THREE_OF_A_KIND << CATEGORY_SHIFT | trips << 16 | _TOP_RANKS[2][rank_mask & ~(1 << trips)] << 8
+    pair = _HIGHEST_RANK[pair_mask]
+    if pair < 0:
+        return HIGH_CARD << CATEGORY_SHIFT | _TOP_RANKS[5][rank_mask]
+    without_pair = rank_mask & ~(1 << pair)
+    second_pair = _HIGHEST_RANK[pair_mask & without_pair]
+    if second_pair >= 0:
+        return (TWO_PAIR << CATEGORY_SHIFT | pair << 16 | second_pair << 12
+                | _TOP_RANKS[1][without_pair & ~(1 << second_pair)] << 8)
+    return PAIR << CATEGORY_SHIFT | pair << 16 | _TOP_RANKS[3][without_pair] << 4
+
+
+def hand_category(value: int) -> int:
+    """Return the category of a hand value, from HIGH_CARD to STRAIGHT_FLUSH."""
+    return value >> CATEGORY_SHIFT
+
+
+def equity(hole_cards: List[str], board_cards: List[str], num_samples: int = 256,
+           rng: Optional[np.random.Generator] = None) -> float:
+    """
+    Estimate the probability of winning at showdown against a random hand, ties counting half,
+    by sampling the opponent cards and the rest of the board for all the samples at once.
+    """
+    rng = rng or np.random.default_rng()
+    known = cards_to_indices(hole_cards + board_cards)
+    deck = np.setdiff1d(np.arange(52, dtype=np.int32), known)
+    num_missing = 5 - len(board_cards)
+    
+    # Distinct cards for each sample: the first two for the opponent, the rest for the board
+    draws = deck[rng.random((num_samples, len(deck))).argsort(axis=1)[:, :2 + num_missing]]
+    board = np.concatenate([np.broadcast_to(known[2:], (num_samples, len(board_cards))), draws[:, 2:]], axis=1)
+    ours = evaluate_hands(np.concatenate([np.broadcast_to(known[:2], (num_samples, 2)), board], axis=1))
+    theirs = evaluate_hands(np.concatenate([draws[:, :2], board], axis=1))
+    return float(np.mean((ours > theirs) + 0.5 * (ours == theirs)))
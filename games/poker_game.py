@@ -3,18 +3,135 @@ PokerGame implementation of AbstractGame interface for MuZero training.
 Interfaces with MIT Pokerbots Engine via PokerSocket communication layer.
 """
 
+import time
 import numpy as np
-from typing import List, Tuple, Optional
+from typing import Dict, List, Tuple, Optional
 from .abstract_game import AbstractGame
-from .poker_socket import PokerSocket
+from .poker_simulator import SimulatedPokerSocket
+from .poker_evaluator import equity, evaluate, hand_category, STRAIGHT_FLUSH
+from .poker_socket import CARD_INDEX, PokerSocket
+
+
+OBSERVATION_SIZE = 200  # ~200 dimensions
+# Feature of each action among the 4 features of its slot in the action history, the 4th holds raise amounts
+ACTION_FEATURES = {'F': 0, 'C': 1, 'K': 2}
+
+
+def encode_observation(message: Optional[dict], out: Optional[np.ndarray] = None) -> np.ndarray:
+    """Encode an engine message into an observation vector, written into out when it is given."""
+    if out is None:
+        out = np.zeros(OBSERVATION_SIZE, dtype=np.float32)
+    else:
+        out.fill(0.0)
+    if message:
+        _write_features(message, out)
+    return out
+
+
+def encode_observations(messages: List[Optional[dict]], out: Optional[np.ndarray] = None) -> np.ndarray:
+    """Encode many engine messages into the rows of one (N, 200) array, written into out when it is given."""
+    if out is None:
+        out = np.zeros((len(messages), OBSERVATION_SIZE), dtype=np.float32)
+    else:
+        out[:len(messages)] = 0.0
+    for row, message in zip(out, messages):
+        if message:
+            _write_features(message, row)
+    return out
+
+
+def _write_features(message: dict, obs: np.ndarray) -> None:
+    """Set the features of a message in a zeroed observation vector."""
+    # Time remaining (normalized to 0-1)
+    if message.get('time_remaining'):
+        obs[0] = min(message['time_remaining'] / 600.0, 1.0)
+    
+    # Player index
+    if message.get('player_index') is not None:
+        obs[1] = message['player_index']
+    
+    # Hole cards (52 binary features for each card)
+    for card in message.get('hole_cards', [])[:2]:
+        card_idx = CARD_INDEX.get(card)
+        if card_idx is not None:
+            obs[2 + card_idx] = 1.0
+    
+    # Board cards (52 binary features)
+    for card in message.get('board_cards', [])[:5]:
+        card_idx = CARD_INDEX.get(card)
+        if card_idx is not None:
+            obs[54 + card_idx] = 1.0
+    
+    # Action history encoding (last 10 actions)
+    for i, action in enumerate(message.get('action_history', [])[-10:]):
+        feature = ACTION_FEATURES.get(action)
+        if feature is not None:
+            obs[106 + i*4 + feature] = 1.0
+        elif action[:1] == 'R':
+            obs[109 + i*4] = min(int(action[1:]) / 400.0, 1.0)
+    
+    # Bankroll delta (normalized)
+    if message.get('bankroll_delta') is not None:
+        obs[146] = message['bankroll_delta'] / 400.0
+
+
+# Number of board cards on each street
+STREET_BOARD_SIZES = (0, 3, 4, 5)
+
+
+def replay_betting(action_history: List[str], num_board_cards: int, starting_stack: int = 400,
+                   small_blind: int = 1, big_blind: int = 2) -> Optional[Dict]:
+    """
+    Replay the actions of the hand to find the street pips, the stacks and the seat to act.
+    Return None if the hand is over or the actions do not lead to the street of the board.
+    """
+    pips = [small_blind, big_blind]
+    stacks = [starting_stack - small_blind, starting_stack - big_blind]
+    active, street, street_moves = 0, 0, 0
+    for action in action_history:
+        next_street = False
+        if action == 'F':
+            return None
+        elif action[:1] == 'R':
+            amount = int(action[1:])
+            stacks[active] -= amount - pips[active]
+            pips[active] = amount
+        elif action == 'C':
+            stacks[active] -= pips[1 - active] - pips[active]
+            pips[active] = pips[1 - active]
+            # The small blind calling preflop gives the big blind the option to raise
+            next_street = street > 0 or street_moves > 0
+        elif action == 'K':
+            # The street ends when the second player to act checks
+            next_street = street_moves > 0
+        
+        if next_street:
+            # The big blind acts first after the flop
+            street += 1
+            pips = [0, 0]
+            active, street_moves = 1, 0
+        else:
+            street_moves += 1
+            active = 1 - active
+    
+    if street >= len(STREET_BOARD_SIZES) or STREET_BOARD_SIZES[street] != num_board_cards:
+        return None
+    return {'pips': pips, 'stacks': stacks, 'active': active, 'pot': 2 * starting_stack - sum(stacks)}
 
 
 class PokerGame(AbstractGame):
     """MuZero game interface for poker using MIT Pokerbots Engine."""
     
-    def __init__(self, seed: Optional[int] = None, training_mode: bool = True):
+    def __init__(self, seed: Optional[int] = None, training_mode: bool = True, hands_per_episode: Optional[int] = None,
+                 poker_socket: Optional[PokerSocket] = None, simulated: bool = False, equity_features: bool = False):
         self.training_mode = training_mode
         self.seed = seed
+        # Add the equity and the category of our hand to the observations
+        self.equity_features = equity_features
+        self.equity_samples = 128
+        self.rng = np.random.default_rng(seed)
+        # Episodes end after this many hands, or at the end of the match if None
+        self.hands_per_episode = hands_per_episode
         
         # Training vs competition timeouts
         config_overrides = {}
@@ -25,15 +142,41 @@ class PokerGame(AbstractGame):
                 'ENFORCE_GAME_CLOCK': 'False'  # Disable for initial training
             }
         
-        self.poker_socket = PokerSocket(config_overrides=config_overrides)
+        # Each game runs its own engine on its own port, unless one is given (e.g. from an EnginePool),
+        # or plays in-process against the simulator without any engine
+        if poker_socket is None:
+            if simulated:
+                poker_socket = SimulatedPokerSocket(config_overrides=config_overrides, seed=seed)
+            else:
+                poker_socket = PokerSocket(config_overrides=config_overrides)
+        elif not isinstance(poker_socket, PokerSocket):
+            # An AsyncPokerSocket has coroutine methods, which the game would never await
+            raise TypeError(f"PokerGame needs a PokerSocket, got {type(poker_socket).__name__}")
+        self.poker_socket = poker_socket
+        self.engine_ready_timeout = 10.0
         self.current_observation = None
         self.game_over = False
         self.last_reward = 0.0
         
+        # The engine and its connection are kept across episodes until the match is over
+        self.match_over = True
+        self.hands_played = 0
+        
+        # Game clock from the last engine message and when it was received
+        self.clock_remaining: Optional[float] = None
+        self.clock_received_at = 0.0
+        
         # Action space: 0=fold, 1=call, 2=check, 3-102=raise amounts
         self.action_space_size = 103
         self.min_raise = 2  # Big blind
         self.max_raise = 400  # Starting stack
+        self.small_blind = 1
+        
+        # Legal actions, betting state and raise amount bounds of the current decision, every action until the first message
+        self.current_message: Optional[dict] = None
+        self.legal_action_list = list(range(self.action_space_size))
+        self.betting_state: Optional[Dict] = None
+        self.raise_bounds: Optional[Tuple[int, int]] = None
         
         # Initialize random state if seed provided
         if seed is not None:
@@ -41,68 +184,33 @@ class PokerGame(AbstractGame):
     
     def _encode_observation(self, message: dict) -> np.ndarray:
         """Convert poker socket message to MuZero observation vector."""
-        # Create observation vector (~200 dimensions)
-        obs = np.zeros(200, dtype=np.float32)
-        
-        if not message:
-            return obs
-            
-        # Time remaining (normalized to 0-1)
-        if message.get('time_remaining'):
-            obs[0] = min(message['time_remaining'] / 600.0, 1.0)
-        
-        # Player index
-        if message.get('player_index') is not None:
-            obs[1] = message['player_index']
-        
-        # Hole cards (52 binary features for each card)
-        hole_cards = message.get('hole_cards', [])
-        for i, card in enumerate(hole_cards[:2]):
-            if card:
-                card_idx = self._card_to_index(card)
-                if card_idx >= 0:
-                    obs[2 + card_idx] = 1.0
-        
-        # Board cards (52 binary features)
-        board_cards = message.get('board_cards', [])
-        for card in board_cards[:5]:
-            if card:
-                card_idx = self._card_to_index(card)
-                if card_idx >= 0:
-                    obs[54 + card_idx] = 1.0
-        
-        # Action history encoding (last 10 actions)
-        action_history = message.get('action_history', [])
-        for i, action in enumerate(action_history[-10:]):
-            if action == 'F':
-                obs[106 + i*4] = 1.0
-            elif action == 'C':
-                obs[107 + i*4] = 1.0
-            elif action == 'K':
-                obs[108 + i*4] = 1.0
-            elif action.startswith('R'):
-                obs[109 + i*4] = min(int(action[1:]) / 400.0, 1.0)
-        
-        # Bankroll delta (normalized)
-        if message.get('bankroll_delta') is not None:
-            obs[146] = message['bankroll_delta'] / 400.0
-            
+        # A new array each time, the game history keeps the observations
+        obs = encode_observation(message)
+        if self.equity_features and message:
+            hole_cards, board_cards = self._known_cards(message)
+            if hole_cards:
+                # Equity against a random hand and category of the made hand once there are 5 cards
+                obs[147] = equity(hole_cards, board_cards, self.equity_samples, self.rng)
+                if board_cards:
+                    obs[148] = hand_category(evaluate(hole_cards + board_cards)) / STRAIGHT_FLUSH
+        return obs
+    
+    def _encode_observation_timed(self, message: dict) -> np.ndarray:
+        """Encode a message, recording the encoding time in the bridge statistics."""
+        start = time.perf_counter()
+        obs = self._encode_observation(message)
+        self.poker_socket.bridge_stats.record('encode', time.perf_counter() - start)
         return obs
     
+    def _known_cards(self, message: dict) -> Tuple[List[str], List[str]]:
+        """Return the valid hole cards, none unless there are two of them, and board cards of a message."""
+        hole_cards = [card for card in message.get('hole_cards', []) if card in CARD_INDEX]
+        board_cards = [card for card in message.get('board_cards', []) if card in CARD_INDEX]
+        return (hole_cards if len(hole_cards) == 2 else []), board_cards[:5]
+    
     def _card_to_index(self, card_str: str) -> int:
         """Convert card string (e.g., 'As', 'Kh') to index 0-51."""
-        if len(card_str) != 2:
-            return -1
-        
-        ranks = '23456789TJQKA'
-        suits = 'shdc'  # spades, hearts, diamonds, clubs
-        
-        try:
-            rank_idx = ranks.index(card_str[0])
-            suit_idx = suits.index(card_str[1])
-            return rank_idx * 4 + suit_idx
-        except ValueError:
-            return -1
+        return CARD_INDEX.get(card_str, -1)
     
     def _action_to_poker_code(self, action: int) -> str:
         """Convert MuZero action index to poker protocol string."""
@@ -113,12 +221,18 @@ class PokerGame(AbstractGame):
         elif action == 2:
             return 'K'  # Check
         elif 3 <= action <= 102:
-            # Raise actions: map to amounts 2-400
-            raise_amount = self.min_raise + ((action - 3) * (self.max_raise - self.min_raise) // 99)
+            # Raise actions: map to amounts 2-400, within the legal amounts when they are known
+            raise_amount = self._raise_amount(action)
+            if self.raise_bounds is not None:
+                raise_amount = min(max(raise_amount, self.raise_bounds[0]), self.raise_bounds[1])
             return f'R{raise_amount}'
         else:
             return 'K'  # Default to check for invalid actions
     
+    def _raise_amount(self, action: int) -> int:
+        """Amount of a raise action bucket, the street total raised to."""
+        return self.min_raise + ((action - 3) * (self.max_raise - self.min_raise) // 99)
+    
     def step(self, action: int) -> Tuple[np.ndarray, float, bool]:
         """Apply action and return (observation, reward, done)."""
         if self.game_over:
@@ -130,51 +244,143 @@ class PokerGame(AbstractGame):
         # Send action to engine
         if not self.poker_socket.send_action(action_code):
             self.game_over = True
+            self.match_over = True
             return self.current_observation, -1.0, True  # Penalty for connection failure
         
         # Receive response
         message = self.poker_socket.receive_message()
         if not message:
             self.game_over = True
+            self.match_over = True
             return self.current_observation, -1.0, True
         
         # Update state
-        self.current_observation = self._encode_observation(message)
-        self.game_over = message.get('game_over', False)
+        self.current_message = message
+        self._update_clock(message)
+        self._update_legal_actions(message)
+        self.current_observation = self._encode_observation_timed(message)
+        self.match_over = message.get('game_over', False)
         
         # Calculate reward
         reward = 0.0
         if message.get('bankroll_delta') is not None:
             reward = message['bankroll_delta'] / 400.0  # Normalize by starting stack
+            self.hands_played += 1
+            self.poker_socket.bridge_stats.count('hands')
+        
+        self.game_over = self.match_over or (
+            self.hands_per_episode is not None and self.hands_played >= self.hands_per_episode
+        )
         
         return self.current_observation, reward, self.game_over
     
     def legal_actions(self) -> List[int]:
         """Return legal actions for current state."""
-        # For now, return all actions - engine will handle illegal action filtering
-        # TODO: Parse game state to determine actual legal actions
-        return list(range(self.action_space_size))
+        return self.legal_action_list
+    
+    def _update_legal_actions(self, message: Optional[dict]) -> None:
+        """Derive the legal actions from the message, the raise buckets collapse to the distinct legal amounts."""
+        self.raise_bounds = None
+        self.betting_state = None
+        if not message:
+            self.legal_action_list = list(range(self.action_space_size))
+            return
+        if not message.get('hole_cards'):
+            # End of round line, the action sent back is ignored
+            self.legal_action_list = [2]
+            return
+        
+        state = replay_betting(message.get('action_history', []), len(message.get('board_cards', [])),
+                               self.max_raise, self.small_blind, self.min_raise)
+        if state is None or state['active'] != message.get('player_index'):
+            # History we cannot follow, the engine will handle illegal action filtering
+            self.legal_action_list = list(range(self.action_space_size))
+            return
+        
+        self.betting_state = state
+        pips, stacks, active = state['pips'], state['stacks'], state['active']
+        continue_cost = pips[1 - active] - pips[active]
+        legal = [2] if continue_cost == 0 else [0, 1]
+        if stacks[0] > 0 and stacks[1] > 0 and continue_cost < stacks[active]:
+            # Raises are to a street total between the minimum raise and all-in
+            max_contribution = min(stacks[active], stacks[1 - active] + continue_cost)
+            min_contribution = min(continue_cost + max(continue_cost, self.min_raise), max_contribution)
+            self.raise_bounds = (pips[active] + min_contribution, pips[active] + max_contribution)
+            amounts = set()
+            for action in range(3, self.action_space_size):
+                amount = min(max(self._raise_amount(action), self.raise_bounds[0]), self.raise_bounds[1])
+                if amount not in amounts:
+                    amounts.add(amount)
+                    legal.append(action)
+        self.legal_action_list = legal
+    
+    def expert_agent(self) -> int:
+        """
+        Hard coded agent playing from the equity of its hand against a random hand: it raises the pot
+        with a strong hand, calls when the equity beats the pot odds, checks when free and folds otherwise.
+        """
+        legal = self.legal_actions()
+        hole_cards, board_cards = self._known_cards(self.current_message or {})
+        if not hole_cards or self.betting_state is None:
+            return 2 if 2 in legal else 1 if 1 in legal else legal[0]
+        
+        hand_equity = equity(hole_cards, board_cards, self.equity_samples, self.rng)
+        pips, active, pot = self.betting_state['pips'], self.betting_state['active'], self.betting_state['pot']
+        continue_cost = pips[1 - active] - pips[active]
+        raises = [action for action in legal if action >= 3]
+        if raises and hand_equity > 0.75:
+            # Raise to about the size of the pot after calling
+            target = pips[1 - active] + pot + continue_cost
+            return min(raises, key=lambda action: abs(int(self._action_to_poker_code(action)[1:]) - target))
+        if continue_cost == 0:
+            return 2
+        if hand_equity >= continue_cost / (pot + continue_cost):
+            return 1
+        return 0
     
     def reset(self) -> np.ndarray:
         """Reset game and return initial observation."""
-        # Close existing connection
-        if self.poker_socket.is_connected():
+        # Continue on the running match if possible, its next message starts the next hand
+        if self.match_over or not self.poker_socket.is_connected() or not self.poker_socket.is_engine_running():
             self.poker_socket.close()
+            
+            # Start new match, connecting as soon as the engine listens
+            if not self.poker_socket.start_engine():
+                raise RuntimeError("Failed to start poker engine")
+            if not self.poker_socket.connect(wait=self.engine_ready_timeout):
+                raise RuntimeError("Failed to connect to poker engine")
+            self.match_over = False
+        elif self.current_message is not None and not self.current_message.get('hole_cards'):
+            # The end of round line that ended the last episode waits for an answer, which the engine ignores
+            self.poker_socket.send_action('K')
         
-        # Start new game
-        if not self.poker_socket.start_engine():
-            raise RuntimeError("Failed to start poker engine")
-        
-        # Wait for initial message
-        time.sleep(1)
         message = self.poker_socket.receive_message()
         
-        self.current_observation = self._encode_observation(message)
+        self.current_message = message
+        self._update_clock(message)
+        self._update_legal_actions(message)
+        self.current_observation = self._encode_observation_timed(message)
         self.game_over = False
         self.last_reward = 0.0
+        self.hands_played = 0
         
         return self.current_observation
     
+    def _update_clock(self, message: Optional[dict]) -> None:
+        """Remember the game clock sent by the engine with the time it was received."""
+        self.clock_remaining = message.get('time_remaining') if message else None
+        self.clock_received_at = time.perf_counter()
+    
+    def stats(self) -> dict:
+        """Return the timings and counters of the engine bridge recorded since the last call and reset them."""
+        return self.poker_socket.bridge_stats.report()
+    
+    def time_remaining(self) -> Optional[float]:
+        """Return the seconds left on our game clock, counting the time since the last message."""
+        if self.clock_remaining is None:
+            return None
+        return max(self.clock_remaining - (time.perf_counter() - self.clock_received_at), 0.0)
+    
     def render(self) -> None:
         """Display current game state."""
         if self.current_observation is not None:
@@ -203,7 +409,6 @@ class PokerGame(AbstractGame):
         elif action_number == 2:
             return "Check"
         elif 3 <= action_number <= 102:
-            raise_amount = self.min_raise + ((action_number - 3) * (self.max_raise - self.min_raise) // 99)
-            return f"Raise {raise_amount}"
+            return f"Raise {self._raise_amount(action_number)}"
         else:
             return f"Unknown action {action_number}"
\ No newline at end of file
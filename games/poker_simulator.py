@@ -0,0 +1,275 @@
+"""
+In-process heads-up no-limit hold'em simulator speaking the engine message protocol.
+Stands in for the MIT Pokerbots Engine subprocess and socket during self-play.
+
+Every line sent to the player expects an action in return, the actions answering the end of
+round lines are ignored:
+    T<clock> P<seat> H<cards> [B<board>] <actions>     our turn to act
+    D<delta> [O<opponent cards>] Y<our hit><opponent hit> [Q]     end of a round, Q ends the match
+"""
+
+import time
+from collections import deque
+from typing import Callable, Deque, Dict, List, Optional, Set, Tuple
+
+import numpy as np
+
+from .poker_evaluator import evaluate
+from .poker_socket import RANKS, SUITS, PokerSocket
+
+
+DECK = [rank + suit for rank in RANKS for suit in SUITS]
+
+# Engine settings, the same defaults as the training config written by PokerSocket
+DEFAULT_CONFIG = {
+    'ENFORCE_GAME_CLOCK': 'True',
+    'STARTING_GAME_CLOCK': 600.0,
+    'NUM_ROUNDS': 1000,
+    'STARTING_STACK': 400,
+    'BIG_BLIND': 2,
+    'SMALL_BLIND': 1,
+    'ROUNDS_PER_BOUNTY': 25,
+    'BOUNTY_RATIO': 1.5,
+    'BOUNTY_CONSTANT': 10,
+}
+
+
+def calling_station(legal_actions: Set[str], raise_bounds: Tuple[int, int]) -> str:
+    """Default opponent, it checks when it can and calls otherwise."""
+    return 'K' if 'K' in legal_actions else 'C'
+
+
+class PokerSimulator:
+    """
+    Heads-up no-limit hold'em match between the player and an opponent policy. It behaves like
+    the socket file of an engine connection: the player reads lines and writes its actions.
+    """
+    
+    def __init__(self, config_overrides: Optional[Dict] = None, seed: Optional[int] = None,
+                 opponent: Callable[[Set[str], Tuple[int, int]], str] = calling_station):
+        config = dict(DEFAULT_CONFIG, **(config_overrides or {}))
+        self.enforce_clock = str(config['ENFORCE_GAME_CLOCK']) == 'True'
+        self.starting_clock = float(config['STARTING_GAME_CLOCK'])
+        self.num_rounds = int(config['NUM_ROUNDS'])
+        self.starting_stack = int(config['STARTING_STACK'])
+        self.big_blind = int(config['BIG_BLIND'])
+        self.small_blind = int(config['SMALL_BLIND'])
+        self.rounds_per_bounty = int(config['ROUNDS_PER_BOUNTY'])
+        self.bounty_ratio = float(config['BOUNTY_RATIO'])
+        self.bounty_constant = int(config['BOUNTY_CONSTANT'])
+        self.opponent = opponent
+        self.rng = np.random.default_rng(seed)
+        self.running = False
+        # Lines for the player, with whether they ask for one of our actions
+        self.pending_lines: Deque[Tuple[str, bool]] = deque()
+        self.awaiting_action = False
+    
+    def start_match(self) -> None:
+        """Start a new match of num_rounds rounds."""
+        self.running = True
+        self.pending_lines.clear()
+        self.awaiting_action = False
+        self.round_num = 0
+        self.bankroll = 0
+        self.clock = self.starting_clock
+        self.bounties = [0, 0]
+        self.round_summary: List[str] = []
+        self._start_round()
+        self._advance()
+    
+    def _start_round(self) -> None:
+        """Shuffle, deal the hole cards and post the blinds, the seat 0 is the small blind."""
+        if self.round_num % self.rounds_per_bounty == 0:
+            self.bounties = [int(rank) for rank in self.rng.integers(len(RANKS), size=2)]
+        # The player alternates between the two seats
+        self.our_seat = self.round_num % 2
+        deck = [DECK[i] for i in self.rng.permutation(len(DECK))]
+        self.hands = [deck[0:2], deck[2:4]]
+        self.deck = deck[4:]
+        self.board: List[str] = []
+        self.pips = [self.small_blind, self.big_blind]
+        self.stacks = [self.starting_stack - self.small_blind, self.starting_stack - self.big_blind]
+        self.street_moves = 0
+        self.active = 0
+        self.actions: List[str] = []
+    
+    def legal_actions(self) -> Tuple[Set[str], Tuple[int, int]]:
+        """Return the legal actions of the active seat and the bounds of the raise amounts."""
+        active = self.active
+        continue_cost = self.pips[1 - active] - self.pips[active]
+        bets_forbidden = self.stacks[0] == 0 or self.stacks[1] == 0
+        legal = {'K'} if continue_cost == 0 else {'F', 'C'}
+        if not bets_forbidden and continue_cost < self.stacks[active]:
+            legal.add('R')
+        # Raise amounts are the total chips put in on the street
+        max_contribution = min(self.stacks[active], self.stacks[1 - active] + continue_cost)
+        min_contribution = min(continue_cost + max(continue_cost, self.big_blind), max_contribution)
+        return legal, (self.pips[active] + min_contribution, self.pips[active] + max_contribution)
+    
+    def _apply(self, action: str) -> bool:
+        """Apply an action of the active seat, return whether the round is over."""
+        legal, (min_raise, max_raise) = self.legal_actions()
+        # Illegal actions become a check, or a fold when checking is not possible
+        if action[:1] == 'R':
+            try:
+                amount = int(action[1:])
+            except ValueError:
+                amount = -1
+            if 'R' not in legal or not min_raise <= amount <= max_raise:
+                action = 'K' if 'K' in legal else 'F'
+        elif action not in legal:
+            action = 'K' if 'K' in legal else 'F'
+        self.actions.append(action)
+        
+        active = self.active
+        if action == 'F':
+            self._end_round(winner=1 - active, showdown=False)
+            return True
+        if action[0] == 'R':
+            amount = int(action[1:])
+            self.stacks[active] -= amount - self.pips[active]
+            self.pips[active] = amount
+        elif action == 'C':
+            contribution = self.pips[1 - active] - self.pips[active]
+            self.stacks[active] -= contribution
+            self.pips[active] += contribution
+            # The small blind calling preflop gives the big blind the option to raise
+            if not (len(self.board) == 0 and self.street_moves == 0):
+                return self._next_street()
+        elif action == 'K':
+            # The street ends when the second player to act checks
+            if self.street_moves > 0:
+                return self._next_street()
+        self.street_moves += 1
+        self.active = 1 - active
+        return False
+    
+    def _next_street(self) -> bool:
+        """Deal the next street, running out the board when a player is all-in, or go to showdown."""
+        while True:
+            if len(self.board) == 5:
+                self._end_round(winner=None, showdown=True)
+                return True
+            num_cards = 3 if len(self.board) == 0 else 1
+            self.board += self.deck[:num_cards]
+            self.deck = self.deck[num_cards:]
+            self.pips = [0, 0]
+            self.street_moves = 0
+            # The big blind acts first after the flop
+            self.active = 1
+            if self.stacks[0] > 0 and self.stacks[1] > 0:
+                return False
+    
+    def _end_round(self, winner: Optional[int], showdown: bool) -> None:
+        """Settle the pot and the bounties, then start the next round or end the match."""
+        contributions = [self.starting_stack - stack for stack in self.stacks]
+        if showdown:
+            strengths = [evaluate(self.hands[seat] + self.board) for seat in range(2)]
+            if strengths[0] != strengths[1]:
+                winner = 0 if strengths[0] > strengths[1] else 1
+        
+        # Bounties are indexed by player, 0 for us and 1 for the opponent. Both hits are reported,
+        # only the one of the winner is paid
+        seats = [self.our_seat, 1 - self.our_seat]
+        hits = [any(RANKS.index(card[0]) == self.bounties[player] for card in self.hands[seat] + self.board)
+                for player, seat in enumerate(seats)]
+        delta = 0
+        if winner is not None:
+            winning_player = 0 if winner == self.our_seat else 1
+            winnings = contributions[1 - winner]
+            if hits[winning_player]:
+                winnings = int(self.bounty_ratio * winnings) + self.bounty_constant
+            delta = winnings if winning_player == 0 else -winnings
+        self.bankroll += delta
+        
+        self.round_summary = [f'D{delta}']
+        if showdown:
+            self.round_summary.append('O' + ','.join(self.hands[seats[1]]))
+        self.round_summary.append(f'Y{int(hits[0])}{int(hits[1])}')
+        self.round_num += 1
+        if self.round_num < self.num_rounds:
+            self._start_round()
+    
+    def _advance(self) -> None:
+        """Let the opponent play until it is our turn, queueing the lines of the finished rounds."""
+        while True:
+            match_over = self.round_num >= self.num_rounds or (self.enforce_clock and self.clock <= 0)
+            if self.round_summary:
+                clauses, self.round_summary = self.round_summary, []
+                if match_over:
+                    clauses.append('Q')
+                self.pending_lines.append((' '.join(clauses), False))
+            if match_over:
+                self.running = False
+                return
+            if self.active == self.our_seat:
+                break
+            legal, raise_bounds = self.legal_actions()
+            self._apply(self.opponent(legal, raise_bounds))
+        
+        clauses = [f'T{self.clock:.3f}', f'P{self.our_seat}', 'H' + ','.join(self.hands[self.our_seat])]
+        if self.board:
+            clauses.append('B' + ','.join(self.board))
+        self.pending_lines.append((' '.join(clauses + self.actions), True))
+    
+    def readline(self) -> str:
+        """Return the next line for the player, an empty string when there is none."""
+        if not self.pending_lines:
+            return ''
+        line, self.awaiting_action = self.pending_lines.popleft()
+        self.sent_at = time.perf_counter()
+        return line + '\n'
+    
+    def write(self, data: str) -> None:
+        """Play the action written by the player if the last line asked for one."""
+        for action in data.split():
+            if not self.awaiting_action:
+                continue
+            self.awaiting_action = False
+            if self.enforce_clock:
+                self.clock -= time.perf_counter() - self.sent_at
+            self._apply(action)
+            self._advance()
+    
+    def flush(self) -> None:
+        pass
+    
+    def close(self) -> None:
+        self.running = False
+        self.pending_lines.clear()
+        self.awaiting_action = False
+
+
+class SimulatedPokerSocket(PokerSocket):
+    """PokerSocket connected to an in-process PokerSimulator instead of an engine subprocess."""
+    
+    def __init__(self, config_overrides: Optional[Dict] = None, seed: Optional[int] = None,
+                 opponent: Callable[[Set[str], Tuple[int, int]], str] = calling_station):
+        super().__init__(config_overrides=config_overrides)
+        self.simulator = PokerSimulator(self.config_overrides, seed, opponent)
+    
+    def start_engine(self) -> bool:
+        """Start a new match in the simulator."""
+        self.engine_started_at = time.perf_counter()
+        self.simulator.start_match()
+        return True
+    
+    def connect(self, port: Optional[int] = None, wait: float = 0.0) -> bool:
+        """Read and write the simulator instead of a socket."""
+        self.socketfile = self.simulator
+        self._connected()
+        return True
+    
+    def close(self) -> None:
+        """Stop the simulator."""
+        self.simulator.close()
+        self.socketfile = None
+        self.is_connected_flag = False
+    
+    def is_connected(self) -> bool:
+        """Check if the simulator is attached."""
+        return self.is_connected_flag
+    
+    def is_engine_running(self) -> bool:
+        """Check if the simulator match is still running."""
+        return self.simulator.running
@@ -3,36 +3,179 @@ Socket communication layer for interfacing MuZero with MIT Pokerbots Engine.
 Handles subprocess management, socket I/O, and message parsing.
 """
 
+import asyncio
+import bisect
 import socket
 import subprocess
 import os
+import shutil
+import tempfile
 import time
 import json
-from typing import Optional, Dict, List, Any
-from threading import Thread
+from typing import Optional, Dict, List, Any, Callable
+from threading import Thread, RLock
 from queue import Queue
+from collections import deque
 
 
-class PokerSocket:
-    """Manages communication with the poker engine via subprocess and socket."""
+# Most recent engine output lines kept, older lines are dropped
+STDOUT_LIMIT = 1000
+# Upper bounds in seconds of the timing histogram buckets, from 10us to 10s, the last bucket is unbounded
+LATENCY_BUCKETS = [10 ** (exponent / 4) for exponent in range(-20, 5)]
+# Default directory of the engine game logs, they outlive the temporary working directories of the engines
+GAME_LOG_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "results", "poker_engine_logs")
+
+
+def find_free_port() -> int:
+    """Ask the OS for a free local TCP port."""
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as free_socket:
+        free_socket.bind(('localhost', 0))
+        return free_socket.getsockname()[1]
+
+
+RANKS = '23456789TJQKA'
+SUITS = 'shdc'  # spades, hearts, diamonds, clubs
+# Index 0-51 of every card string, rank major
+CARD_INDEX = {rank + suit: i * len(SUITS) + j for i, rank in enumerate(RANKS) for j, suit in enumerate(SUITS)}
+
+
+def _split_cards(text: str) -> List[str]:
+    return [card for card in text.split(',') if card]
+
+
+def _field_parser(key: str, convert: Callable[[str], Any]) -> Callable[[Dict[str, Any], str], None]:
+    """Handler storing the converted text after the clause letter in a message field."""
+    def parse(message: Dict[str, Any], clause: str) -> None:
+        message[key] = convert(clause[1:])
+    return parse
+
+
+def _parse_action(message: Dict[str, Any], clause: str) -> None:
+    # F, C and K are single letters, raises carry their amount
+    if len(clause) == 1 or clause[0] == 'R':
+        message['action_history'].append(clause)
+
+
+def _parse_game_over(message: Dict[str, Any], clause: str) -> None:
+    if clause == 'Q':
+        message['game_over'] = True
+
+
+# Handler of each clause type, by the first letter of the clause
+CLAUSE_PARSERS = {
+    'T': _field_parser('time_remaining', float),
+    'P': _field_parser('player_index', int),
+    'H': _field_parser('hole_cards', _split_cards),
+    'B': _field_parser('board_cards', _split_cards),
+    'O': _field_parser('opponent_hand', _split_cards),
+    'D': _field_parser('bankroll_delta', int),
+    'Y': _field_parser('bounty_hits', str),
+    'Q': _parse_game_over,
+    'F': _parse_action,
+    'C': _parse_action,
+    'K': _parse_action,
+    'R': _parse_action,
+}
+
+
+def parse_message(line: str) -> Dict[str, Any]:
+    """Parse an engine message line into structured format in a single pass over its clauses."""
+    message = {
+        'time_remaining': None,
+        'player_index': None,
+        'hole_cards': [],
+        'board_cards': [],
+        'action_history': [],
+        'bankroll_delta': None,
+        'bounty_hits': None,
+        'game_over': False,
+        'opponent_hand': []
+    }
+    for clause in line.split():
+        parser = CLAUSE_PARSERS.get(clause[0])
+        if parser is not None:
+            parser(message, clause)
+    return message
+
+
+class BridgeStats:
+    """
+    Timing histograms and event counters of the poker bridge: action round trips, engine
+    startup, message parsing and encoding, hands played, timeouts and connection failures.
+    """
+    
+    def __init__(self):
+        self.timings: Dict[str, List[int]] = {}
+        self.totals: Dict[str, float] = {}
+        self.counters: Dict[str, int] = {}
+    
+    def record(self, name: str, seconds: float) -> None:
+        """Add a duration to the histogram of its timing."""
+        if name not in self.timings:
+            self.timings[name] = [0] * (len(LATENCY_BUCKETS) + 1)
+            self.totals[name] = 0.0
+        self.timings[name][bisect.bisect_left(LATENCY_BUCKETS, seconds)] += 1
+        self.totals[name] += seconds
     
-    def __init__(self, engine_path: str = "../engine-2025", config_overrides: Optional[Dict] = None):
+    def count(self, name: str, increment: int = 1) -> None:
+        """Count an event."""
+        self.counters[name] = self.counters.get(name, 0) + increment
+    
+    def report(self) -> Dict[str, Any]:
+        """Return the statistics recorded since the last report and reset them."""
+        stats = {
+            'timings': self.timings,
+            'totals': self.totals,
+            'counters': self.counters,
+            'bucket_edges': LATENCY_BUCKETS,
+        }
+        self.__init__()
+        return stats
+
+
+class EngineBridge:
+    """
+    State shared by the poker engine transports, without any I/O: the config file, working directory
+    and port of the engine, its captured output, message parsing and the bridge statistics.
+    """
+    
+    def __init__(self, engine_path: str = "../engine-2025", config_overrides: Optional[Dict] = None,
+                 port: Optional[int] = None, work_dir: Optional[str] = None, log_dir: str = GAME_LOG_DIR):
         self.engine_path = os.path.abspath(engine_path)
         self.config_overrides = config_overrides or {}
+        self.log_dir = os.path.abspath(log_dir)
+        # Each engine gets its own port and working directory so that several can run at once,
+        # a free port and a temporary directory are used when they are not given
+        self.requested_port = port
+        self.port = port
+        self.requested_work_dir = work_dir
+        self.work_dir = work_dir
         self.engine_process = None
-        self.socket_connection = None
-        self.socketfile = None
         self.is_connected_flag = False
-        self.stdout_queue = Queue()
+        self.stdout_lines = deque(maxlen=STDOUT_LIMIT)
+        self.bridge_stats = BridgeStats()
+        # When the last action was sent and when the engine was started, for the latencies
+        self.action_sent_at: Optional[float] = None
+        self.engine_started_at: Optional[float] = None
         
     def _create_training_config(self) -> str:
-        """Create a temporary config file with training-specific settings."""
+        """Create the config file of the engine in its working directory with training-specific settings."""
+        if self.work_dir is None:
+            self.work_dir = tempfile.mkdtemp(prefix="poker_engine_")
+        os.makedirs(self.work_dir, exist_ok=True)
+        if self.port is None:
+            self.port = find_free_port()
+        # One game log per match, named after its start time and port so that parallel engines do not collide
+        os.makedirs(self.log_dir, exist_ok=True)
+        game_log = os.path.join(self.log_dir, f"muzero_training_log_{time.strftime('%Y%m%d-%H%M%S')}_{self.port}")
+        
         config_content = f"""# Training configuration for MuZero integration
+PORT = {self.port}
 PLAYER_1_NAME = "MuZero"
-PLAYER_1_PATH = "./muzero_bot"
+PLAYER_1_PATH = "{os.path.join(self.engine_path, 'muzero_bot')}"
 PLAYER_2_NAME = "Opponent" 
-PLAYER_2_PATH = "./python_skeleton"
-GAME_LOG_FILENAME = "muzero_training_log"
+PLAYER_2_PATH = "{os.path.join(self.engine_path, 'python_skeleton')}"
+GAME_LOG_FILENAME = "{game_log}"
 PLAYER_LOG_SIZE_LIMIT = 524288
 ENFORCE_GAME_CLOCK = {self.config_overrides.get('ENFORCE_GAME_CLOCK', 'True')}
 STARTING_GAME_CLOCK = {self.config_overrides.get('STARTING_GAME_CLOCK', 600.0)}
@@ -47,13 +190,65 @@ BOUNTY_RATIO = 1.5
 BOUNTY_CONSTANT = 10
 PLAYER_TIMEOUT = {self.config_overrides.get('PLAYER_TIMEOUT', 120)}
 """
-        config_path = os.path.join(self.engine_path, "training_config.py")
+        config_path = os.path.join(self.work_dir, "training_config.py")
         with open(config_path, 'w') as f:
             f.write(config_content)
         return config_path
         
+    def _engine_env(self) -> Dict[str, str]:
+        """Environment of the engine, its PYTHONPATH finds the training config before the engine modules."""
+        env = os.environ.copy()
+        env['PYTHONPATH'] = os.pathsep.join([self.work_dir, self.engine_path])
+        return env
+    
+    def _parse_line(self, line: str) -> Dict[str, Any]:
+        """Parse a received line, recording the round trip since the last action and the parse time."""
+        received_at = time.perf_counter()
+        if self.action_sent_at is not None:
+            self.bridge_stats.record('round_trip', received_at - self.action_sent_at)
+            self.action_sent_at = None
+        message = parse_message(line)
+        self.bridge_stats.record('parse', time.perf_counter() - received_at)
+        return message
+    
+    def _connected(self) -> None:
+        """Mark the connection as established, recording the engine startup time."""
+        self.is_connected_flag = True
+        if self.engine_started_at is not None:
+            self.bridge_stats.record('engine_startup', time.perf_counter() - self.engine_started_at)
+            self.engine_started_at = None
+    
+    def _connection_failed(self, error: Exception) -> None:
+        self.bridge_stats.count('connection_failures')
+        print(f"Connection failed: {error}")
+    
+    def _release_work_dir(self) -> None:
+        """The next engine starts in a fresh directory on a fresh port unless they were given."""
+        if self.requested_work_dir is None and self.work_dir is not None:
+            shutil.rmtree(self.work_dir, ignore_errors=True)
+        self.work_dir = self.requested_work_dir
+        self.port = self.requested_port
+    
+    def get_stdout_lines(self) -> List[str]:
+        """Get captured stdout lines from engine."""
+        lines = []
+        while self.stdout_lines:
+            lines.append(self.stdout_lines.popleft())
+        return lines
+
+
+class PokerSocket(EngineBridge):
+    """Manages communication with the poker engine via subprocess and socket."""
+    
+    def __init__(self, engine_path: str = "../engine-2025", config_overrides: Optional[Dict] = None,
+                 port: Optional[int] = None, work_dir: Optional[str] = None, log_dir: str = GAME_LOG_DIR):
+        super().__init__(engine_path, config_overrides, port, work_dir, log_dir)
+        self.socket_connection = None
+        self.socketfile = None
+    
     def start_engine(self) -> bool:
-        """Start the poker engine subprocess with training configuration."""
+        """Start the poker engine subprocess with training configuration, connect() waits for it to listen."""
+        self.engine_started_at = time.perf_counter()
         try:
             # Create training config
             config_path = self._create_training_config()
@@ -62,46 +257,52 @@ PLAYER_TIMEOUT = {self.config_overrides.get('PLAYER_TIMEOUT', 120)}
             engine_script = os.path.join(self.engine_path, "engine.py")
             cmd = ["python3", engine_script]
             
-            # Set PYTHONPATH to find the training config
-            env = os.environ.copy()
-            env['PYTHONPATH'] = self.engine_path
-            
             self.engine_process = subprocess.Popen(
                 cmd,
                 stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE,
-                cwd=self.engine_path,
-                env=env
+                stderr=subprocess.STDOUT,
+                cwd=self.work_dir,
+                env=self._engine_env()
             )
             
-            # Start thread to capture stdout
+            # Start thread to capture stdout, the engine never blocks on a full pipe and only the last lines are kept
             def capture_output():
                 if self.engine_process and self.engine_process.stdout:
                     for line in iter(self.engine_process.stdout.readline, b''):
-                        self.stdout_queue.put(line.decode().strip())
+                        self.stdout_lines.append(line.decode().strip())
                         
             Thread(target=capture_output, daemon=True).start()
             
-            # Give engine time to start
-            time.sleep(2)
             return self.engine_process.poll() is None
             
         except Exception as e:
             print(f"Failed to start engine: {e}")
             return False
     
-    def connect(self, port: int = 12345) -> bool:
-        """Establish socket connection with the engine."""
-        try:
-            self.socket_connection = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-            self.socket_connection.settimeout(10.0)
-            self.socket_connection.connect(('localhost', port))
-            self.socketfile = self.socket_connection.makefile('rw')
-            self.is_connected_flag = True
-            return True
-        except Exception as e:
-            print(f"Connection failed: {e}")
-            return False
+    def connect(self, port: Optional[int] = None, wait: float = 0.0) -> bool:
+        """Establish socket connection with the engine, retrying for up to wait seconds until it listens."""
+        port = port if port is not None else self.port
+        deadline = time.perf_counter() + wait
+        while True:
+            try:
+                self.socket_connection = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+                self.socket_connection.settimeout(10.0)
+                self.socket_connection.connect(('localhost', port))
+                self.socketfile = self.socket_connection.makefile('rw')
+                self._connected()
+                return True
+            except ConnectionRefusedError as e:
+                # The engine is not listening yet, give up once it exited or the wait is over
+                self.socket_connection.close()
+                self.socket_connection = None
+                engine_exited = self.engine_process is not None and self.engine_process.poll() is not None
+                if engine_exited or deadline <= time.perf_counter():
+                    self._connection_failed(e)
+                    return False
+                time.sleep(0.05)
+            except Exception as e:
+                self._connection_failed(e)
+                return False
     
     def receive_message(self) -> Optional[Dict[str, Any]]:
         """Parse incoming socket message into structured format."""
@@ -111,49 +312,14 @@ PLAYER_TIMEOUT = {self.config_overrides.get('PLAYER_TIMEOUT', 120)}
         try:
             line = self.socketfile.readline().strip()
             if not line:
+                self.bridge_stats.count('disconnects')
                 return None
-                
-            clauses = line.split(' ')
-            message = {
-                'time_remaining': None,
-                'player_index': None,
-                'hole_cards': [],
-                'board_cards': [],
-                'action_history': [],
-                'bankroll_delta': None,
-                'bounty_hits': None,
-                'game_over': False,
-                'opponent_hand': []
-            }
-            
-            for clause in clauses:
-                if not clause:
-                    continue
-                    
-                if clause.startswith('T'):
-                    message['time_remaining'] = float(clause[1:])
-                elif clause.startswith('P'):
-                    message['player_index'] = int(clause[1:])
-                elif clause.startswith('H'):
-                    cards = clause[1:].split(',') if len(clause) > 1 else []
-                    message['hole_cards'] = [c for c in cards if c]
-                elif clause.startswith('B'):
-                    cards = clause[1:].split(',') if len(clause) > 1 else []
-                    message['board_cards'] = [c for c in cards if c]
-                elif clause.startswith('O'):
-                    cards = clause[1:].split(',') if len(clause) > 1 else []
-                    message['opponent_hand'] = [c for c in cards if c]
-                elif clause.startswith('D'):
-                    message['bankroll_delta'] = int(clause[1:])
-                elif clause.startswith('Y'):
-                    message['bounty_hits'] = clause[1:]
-                elif clause == 'Q':
-                    message['game_over'] = True
-                elif clause in ['F', 'C', 'K'] or clause.startswith('R'):
-                    message['action_history'].append(clause)
-                    
-            return message
+            return self._parse_line(line)
             
+        except socket.timeout as e:
+            self.bridge_stats.count('timeouts')
+            print(f"Message receive timed out: {e}")
+            return None
         except Exception as e:
             print(f"Message parsing failed: {e}")
             return None
@@ -166,8 +332,10 @@ PLAYER_TIMEOUT = {self.config_overrides.get('PLAYER_TIMEOUT', 120)}
         try:
             self.socketfile.write(action_code + '\n')
             self.socketfile.flush()
+            self.action_sent_at = time.perf_counter()
             return True
         except Exception as e:
+            self.bridge_stats.count('send_failures')
             print(f"Action send failed: {e}")
             return False
     
@@ -175,20 +343,244 @@ PLAYER_TIMEOUT = {self.config_overrides.get('PLAYER_TIMEOUT', 120)}
         """Clean up socket connection and engine process."""
         if self.socketfile:
             self.socketfile.close()
+            self.socketfile = None
         if self.socket_connection:
             self.socket_connection.close()
+            self.socket_connection = None
         if self.engine_process:
             self.engine_process.terminate()
             self.engine_process.wait(timeout=5)
+            self.engine_process = None
+        self._release_work_dir()
         self.is_connected_flag = False
     
     def is_connected(self) -> bool:
         """Check if socket connection is active."""
         return self.is_connected_flag and self.socket_connection is not None
     
-    def get_stdout_lines(self) -> List[str]:
-        """Get captured stdout lines from engine."""
-        lines = []
-        while not self.stdout_queue.empty():
-            lines.append(self.stdout_queue.get())
-        return lines
\ No newline at end of file
+    def is_engine_running(self) -> bool:
+        """Check if the engine process is alive, an engine not started by us counts as running."""
+        return self.engine_process is None or self.engine_process.poll() is None
+
+
+class AsyncPokerSocket(EngineBridge):
+    """
+    Engine transport on asyncio streams with the protocol of PokerSocket. Its methods are coroutines
+    so that one event loop can drive many engine connections at once, which makes it a separate
+    class: PokerGame and EnginePool call PokerSocket synchronously and cannot use it.
+    It connects over TCP, over a Unix-domain socket in the working directory of the engine when
+    unix_socket is set, or over an already connected socket such as one end of a socketpair.
+    Sends wait until the transport drained and the engine output is read into a bounded buffer.
+    """
+    
+    def __init__(self, engine_path: str = "../engine-2025", config_overrides: Optional[Dict] = None,
+                 port: Optional[int] = None, work_dir: Optional[str] = None, log_dir: str = GAME_LOG_DIR,
+                 unix_socket: bool = False, timeout: float = 10.0):
+        super().__init__(engine_path, config_overrides, port, work_dir, log_dir)
+        self.unix_socket = unix_socket
+        self.timeout = timeout
+        self.reader: Optional[asyncio.StreamReader] = None
+        self.writer: Optional[asyncio.StreamWriter] = None
+        self.stdout_task: Optional[asyncio.Task] = None
+    
+    @property
+    def unix_path(self) -> Optional[str]:
+        """Path of the Unix-domain socket the engine listens on, if any."""
+        if not self.unix_socket or self.work_dir is None:
+            return None
+        return os.path.join(self.work_dir, "engine.sock")
+    
+    def _create_training_config(self) -> str:
+        """Create the config file, with the Unix-domain socket path when the engine should listen on one."""
+        config_path = super()._create_training_config()
+        if self.unix_socket:
+            with open(config_path, 'a') as f:
+                f.write(f'SOCKET_PATH = "{self.unix_path}"\n')
+        return config_path
+    
+    async def start_engine(self) -> bool:
+        """Start the poker engine subprocess with training configuration, connect() waits for it to listen."""
+        self.engine_started_at = time.perf_counter()
+        try:
+            self._create_training_config()
+            engine_script = os.path.join(self.engine_path, "engine.py")
+            self.engine_process = await asyncio.create_subprocess_exec(
+                "python3", engine_script,
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.STDOUT,
+                cwd=self.work_dir,
+                env=self._engine_env()
+            )
+            self.stdout_task = asyncio.ensure_future(self._capture_output())
+            return self.engine_process.returncode is None
+            
+        except Exception as e:
+            print(f"Failed to start engine: {e}")
+            return False
+    
+    async def _capture_output(self) -> None:
+        """Keep only the last engine output lines, the pipe is read as the lines come."""
+        async for line in self.engine_process.stdout:
+            self.stdout_lines.append(line.decode().strip())
+    
+    async def connect(self, port: Optional[int] = None, wait: float = 0.0,
+                      sock: Optional[socket.socket] = None) -> bool:
+        """Open the streams to the engine, retrying for up to wait seconds until it listens."""
+        port = port if port is not None else self.port
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + wait
+        while True:
+            try:
+                if sock is not None:
+                    self.reader, self.writer = await asyncio.open_connection(sock=sock)
+                elif self.unix_socket:
+                    self.reader, self.writer = await asyncio.open_unix_connection(self.unix_path)
+                else:
+                    self.reader, self.writer = await asyncio.open_connection('localhost', port)
+                self._connected()
+                return True
+            except (ConnectionRefusedError, FileNotFoundError) as e:
+                # The engine is not listening yet, give up once it exited or the wait is over
+                engine_exited = self.engine_process is not None and self.engine_process.returncode is not None
+                if engine_exited or deadline <= loop.time():
+                    self._connection_failed(e)
+                    return False
+                await asyncio.sleep(0.05)
+            except Exception as e:
+                self._connection_failed(e)
+                return False
+    
+    async def receive_message(self) -> Optional[Dict[str, Any]]:
+        """Wait for the next engine message and parse it."""
+        if not self.reader:
+            return None
+        
+        try:
+            line = (await asyncio.wait_for(self.reader.readline(), self.timeout)).decode().strip()
+            if not line:
+                self.bridge_stats.count('disconnects')
+                return None
+            return self._parse_line(line)
+            
+        except asyncio.TimeoutError as e:
+            self.bridge_stats.count('timeouts')
+            print(f"Message receive timed out: {e}")
+            return None
+        except Exception as e:
+            print(f"Message parsing failed: {e}")
+            return None
+    
+    async def send_action(self, action_code: str) -> bool:
+        """Send action to engine, waiting while its transport buffer is full."""
+        if not self.writer:
+            return False
+        
+        try:
+            self.writer.write((action_code + '\n').encode())
+            await self.writer.drain()
+            self.action_sent_at = time.perf_counter()
+            return True
+        except Exception as e:
+            self.bridge_stats.count('send_failures')
+            print(f"Action send failed: {e}")
+            return False
+    
+    async def close(self) -> None:
+        """Clean up streams and engine process."""
+        if self.writer:
+            self.writer.close()
+            try:
+                await self.writer.wait_closed()
+            except Exception:
+                pass
+            self.writer = None
+        self.reader = None
+        if self.engine_process:
+            if self.engine_process.returncode is None:
+                self.engine_process.terminate()
+            await asyncio.wait_for(self.engine_process.wait(), 5)
+            self.engine_process = None
+        if self.stdout_task:
+            self.stdout_task.cancel()
+            self.stdout_task = None
+        self._release_work_dir()
+        self.is_connected_flag = False
+    
+    def is_connected(self) -> bool:
+        """Check if the streams are open."""
+        return self.is_connected_flag and self.writer is not None and not self.writer.is_closing()
+    
+    def is_engine_running(self) -> bool:
+        """Check if the engine process is alive, an engine not started by us counts as running."""
+        return self.engine_process is None or self.engine_process.returncode is None
+
+
+class EnginePool:
+    """
+    Isolated poker engines for parallel self-play, each with its own port, config file,
+    working directory and process. Crashed engines are restarted by the health checks, which
+    leave the engines acquired by a game alone so that its match is not killed.
+    """
+    
+    def __init__(self, size: int, engine_path: str = "../engine-2025", config_overrides: Optional[Dict] = None,
+                 ready_timeout: float = 10.0, log_dir: str = GAME_LOG_DIR):
+        self.sockets = [PokerSocket(engine_path, config_overrides, log_dir=log_dir) for _ in range(size)]
+        self.ready_timeout = ready_timeout
+        self.available = Queue()
+        for poker_socket in self.sockets:
+            self.available.put(poker_socket)
+        # Engines taken by a game, guarded with the restart count by the lock
+        self.acquired = set()
+        self.num_restarts = 0
+        self.lock = RLock()
+    
+    def start(self) -> bool:
+        """Start every engine, the processes are launched first so that they boot in parallel."""
+        started = [poker_socket.start_engine() for poker_socket in self.sockets]
+        connected = [poker_socket.connect(wait=self.ready_timeout) for poker_socket in self.sockets]
+        return all(started) and all(connected)
+    
+    def is_healthy(self, poker_socket: PokerSocket) -> bool:
+        """Check that the engine process is alive and connected."""
+        return (poker_socket.engine_process is not None and poker_socket.is_engine_running()
+                and poker_socket.is_connected())
+    
+    def restart(self, poker_socket: PokerSocket) -> bool:
+        """Replace the engine of a socket by a new process and connection."""
+        poker_socket.close()
+        with self.lock:
+            self.num_restarts += 1
+        return poker_socket.start_engine() and poker_socket.connect(wait=self.ready_timeout)
+    
+    def check_health(self) -> int:
+        """
+        Restart the available engines which crashed or lost their connection, return how many were
+        restarted. The lock is held so that they are not acquired while restarting.
+        """
+        restarted = 0
+        with self.lock:
+            for poker_socket in self.sockets:
+                if poker_socket not in self.acquired and not self.is_healthy(poker_socket):
+                    self.restart(poker_socket)
+                    restarted += 1
+        return restarted
+    
+    def acquire(self, timeout: Optional[float] = None) -> PokerSocket:
+        """Take an engine for a game, restarting it first if it is not healthy."""
+        poker_socket = self.available.get(timeout=timeout)
+        with self.lock:
+            self.acquired.add(poker_socket)
+        if not self.is_healthy(poker_socket):
+            self.restart(poker_socket)
+        return poker_socket
+    
+    def release(self, poker_socket: PokerSocket) -> None:
+        """Give back an engine taken with acquire."""
+        with self.lock:
+            self.acquired.discard(poker_socket)
+        self.available.put(poker_socket)
+    
+    def close(self) -> None:
+        """Stop every engine."""
+        for poker_socket in self.sockets:
+            poker_socket.close()
\ No newline at end of file
@@ -0,0 +1,129 @@
+import asyncio
+
+import ray
+import torch
+
+import models
+
+
+@ray.remote
+class InferenceServer:
+    """
+    Class which run in a dedicated thread to evaluate the network for every self-play worker.
+    Requests are gathered into batches of up to inference_max_batch_size positions. A batch
+    is evaluated as soon as it is full or inference_max_wait_us microseconds after its first
+    request arrived.
+    """
+
+    def __init__(self, initial_checkpoint, config):
+        self.config = config
+
+        # Fix random generator seed
+        torch.manual_seed(self.config.seed)
+
+        # Initialize the network
+        self.model = models.MuZeroNetwork(self.config)
+        self.model.set_weights(initial_checkpoint["weights"])
+        self.model.to(torch.device("cuda" if self.config.selfplay_on_gpu else "cpu"))
+        self.model.eval()
+
+        self.training_step = initial_checkpoint["training_step"]
+
+        # Requests waiting to be evaluated, by model method
+        self.pending = {"initial_inference": [], "recurrent_inference": []}
+        self.pending_size = {"initial_inference": 0, "recurrent_inference": 0}
+        self.timers = {"initial_inference": None, "recurrent_inference": None}
+
+    async def continuous_update_weights(self, shared_storage):
+        """
+        Refresh the weights once for all the self-play workers.
+        """
+        while await shared_storage.get_info.remote(
+            "training_step"
+        ) < self.config.training_steps and not await shared_storage.get_info.remote(
+            "terminate"
+        ):
+            training_step = await shared_storage.get_info.remote("training_step")
+            if training_step != self.training_step:
+                self.model.set_weights(await shared_storage.get_info.remote("weights"))
+                self.training_step = training_step
+            await asyncio.sleep(0.5)
+
+    async def initial_inference(self, observation):
+        return await self.submit("initial_inference", (observation,))
+
+    async def recurrent_inference(self, encoded_state, action):
+        return await self.submit("recurrent_inference", (encoded_state, action))
+
+    async def submit(self, method, inputs):
+        future = asyncio.get_running_loop().create_future()
+        self.pending[method].append((inputs, future))
+        self.pending_size[method] += len(inputs[0])
+
+        if self.config.inference_max_batch_size <= self.pending_size[method]:
+            self.flush(method)
+        elif self.timers[method] is None:
+            self.timers[method] = asyncio.get_running_loop().call_later(
+                self.config.inference_max_wait_us / 1e6, self.flush, method
+            )
+
+        return await future
+
+    def flush(self, method):
+        """
+        Evaluate every pending request of a method in a single network call.
+        """
+        if self.timers[method] is not None:
+            self.timers[method].cancel()
+            self.timers[method] = None
+        pending, self.pending[method] = self.pending[method], []
+        self.pending_size[method] = 0
+        if not pending:
+            return
+
+        try:
+            device = next(self.model.parameters()).device
+            inputs = [
+                torch.cat(tensors).to(device)
+                for tensors in zip(*(inputs for inputs, _ in pending))
+            ]
+            with torch.no_grad():
+                outputs = [
+                    output.cpu() for output in getattr(self.model, method)(*inputs)
+                ]
+        except Exception as error:
+            for _, future in pending:
+                if not future.done():
+                    future.set_exception(error)
+            return
+
+        start = 0
+        for inputs, future in pending:
+            end = start + len(inputs[0])
+            if not future.done():
+                # Clone the slices so that only the rows of this request are sent back
+                future.set_result(
+                    tuple(output[start:end].clone() for output in outputs)
+                )
+            start = end
+
+
+class RemoteModel:
+    """
+    Stand-in for the network in MCTS which forwards the inferences to an InferenceServer.
+    """
+
+    def __init__(self, inference_server):
+        self.inference_server = inference_server
+
+    def initial_inference(self, observation):
+        return ray.get(self.inference_server.initial_inference.remote(observation))
+
+    def recurrent_inference(self, encoded_state, action):
+        return ray.get(
+            self.inference_server.recurrent_inference.remote(encoded_state, action)
+        )
+
+    def parameters(self):
+        # The server answers with CPU tensors, MCTS sends its inputs from the CPU too
+        yield torch.empty(0)
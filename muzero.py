@@ -14,6 +14,7 @@ import torch
 from torch.utils.tensorboard import SummaryWriter
 
 import diagnose_model
+import inference_server
 import models
 import replay_buffer
 import self_play
@@ -113,6 +114,10 @@ class MuZero:
             "num_played_games": 0,
             "num_played_steps": 0,
             "num_reanalysed_games": 0,
+            "mcts_profile": None,
+            "resign_threshold": self.config.resign_threshold,
+            "resign_stats": None,
+            "game_stats": None,
             "terminate": False,
         }
         self.replay_buffer = {}
@@ -128,6 +133,7 @@ class MuZero:
         self.reanalyse_worker = None
         self.replay_buffer_worker = None
         self.shared_storage_worker = None
+        self.inference_server_worker = None
 
     def train(self, log_in_tensorboard=True):
         """
@@ -143,7 +149,8 @@ class MuZero:
         if 0 < self.num_gpus:
             num_gpus_per_worker = self.num_gpus / (
                 self.config.train_on_gpu
-                + self.config.num_workers * self.config.selfplay_on_gpu
+                + (1 if self.config.use_inference_server else self.config.num_workers)
+                * self.config.selfplay_on_gpu
                 + log_in_tensorboard * self.config.selfplay_on_gpu
                 + self.config.use_last_model_value * self.config.reanalyse_on_gpu
             )
@@ -174,20 +181,33 @@ class MuZero:
                 num_gpus=num_gpus_per_worker if self.config.reanalyse_on_gpu else 0,
             ).remote(self.checkpoint, self.config)
 
+        if self.config.use_inference_server:
+            self.inference_server_worker = inference_server.InferenceServer.options(
+                num_cpus=0,
+                num_gpus=num_gpus_per_worker if self.config.selfplay_on_gpu else 0,
+            ).remote(self.checkpoint, self.config)
+
         self.self_play_workers = [
             self_play.SelfPlay.options(
                 num_cpus=0,
-                num_gpus=num_gpus_per_worker if self.config.selfplay_on_gpu else 0,
+                num_gpus=num_gpus_per_worker
+                if self.config.selfplay_on_gpu and not self.config.use_inference_server
+                else 0,
             ).remote(
                 self.checkpoint,
                 self.Game,
                 self.config,
                 self.config.seed + seed,
+                self.inference_server_worker,
             )
             for seed in range(self.config.num_workers)
         ]
 
         # Launch workers
+        if self.config.use_inference_server:
+            self.inference_server_worker.continuous_update_weights.remote(
+                self.shared_storage_worker
+            )
         [
             self_play_worker.continuous_self_play.remote(
                 self.shared_storage_worker, self.replay_buffer_worker
@@ -264,6 +284,11 @@ class MuZero:
             "num_reanalysed_games",
         ]
         info = ray.get(self.shared_storage_worker.get_info.remote(keys))
+        # Game counters at the previous logging, for their rates. They start from the ones
+        # of the loaded checkpoint, which may predate the game statistics
+        game_stats = self.checkpoint.get("game_stats")
+        last_game_counters = dict(game_stats["counters"]) if game_stats else {}
+        last_game_stats_time = time.time()
         try:
             while info["training_step"] < self.config.training_steps:
                 info = ray.get(self.shared_storage_worker.get_info.remote(keys))
@@ -314,6 +339,89 @@ class MuZero:
                     counter,
                 )
                 writer.add_scalar("2.Workers/6.Learning_rate", info["lr"], counter)
+                if self.config.profile_mcts:
+                    profile = ray.get(
+                        self.shared_storage_worker.get_info.remote("mcts_profile")
+                    )
+                    if profile and profile["tree_sizes"]:
+                        for phase in profile["time"]:
+                            writer.add_scalar(
+                                f"2.Workers/7.MCTS_time/{phase}",
+                                profile["time"][phase],
+                                counter,
+                            )
+                            writer.add_scalar(
+                                f"2.Workers/8.MCTS_calls/{phase}",
+                                profile["calls"][phase],
+                                counter,
+                            )
+                        writer.add_histogram(
+                            "2.Workers/9.MCTS_tree_size",
+                            numpy.array(profile["tree_sizes"]),
+                            counter,
+                        )
+                        writer.add_histogram(
+                            "2.Workers/10.MCTS_tree_depth",
+                            numpy.array(profile["tree_depths"]),
+                            counter,
+                        )
+                if self.config.resign_threshold is not None:
+                    resign_info = ray.get(
+                        self.shared_storage_worker.get_info.remote(
+                            ["resign_threshold", "resign_stats"]
+                        )
+                    )
+                    resign_stats = resign_info["resign_stats"]
+                    if resign_stats:
+                        writer.add_scalar(
+                            "2.Workers/11.Resign_threshold",
+                            resign_info["resign_threshold"],
+                            counter,
+                        )
+                        writer.add_scalar(
+                            "2.Workers/12.Resigned_games_ratio",
+                            resign_stats["num_resigned_games"]
+                            / max(1, resign_stats["num_games"]),
+                            counter,
+                        )
+                        if resign_stats["false_positive_rate"] is not None:
+                            writer.add_scalar(
+                                "2.Workers/13.Resign_false_positive_rate",
+                                resign_stats["false_positive_rate"],
+                                counter,
+                            )
+                game_stats = ray.get(
+                    self.shared_storage_worker.get_info.remote("game_stats")
+                )
+                if game_stats:
+                    for name, counts in game_stats["timings"].items():
+                        calls = sum(counts)
+                        writer.add_scalar(
+                            f"2.Workers/14.Game_mean_time_ms/{name}",
+                            1000 * game_stats["totals"][name] / max(1, calls),
+                            counter,
+                        )
+                        # Upper bound of the bucket holding the 95th percentile
+                        bucket = numpy.searchsorted(numpy.cumsum(counts), 0.95 * calls)
+                        edges = game_stats["bucket_edges"]
+                        writer.add_scalar(
+                            f"2.Workers/15.Game_p95_time_ms/{name}",
+                            1000 * edges[min(bucket, len(edges) - 1)],
+                            counter,
+                        )
+                    now = time.time()
+                    for name, value in game_stats["counters"].items():
+                        writer.add_scalar(
+                            f"2.Workers/16.Game_counters/{name}", value, counter
+                        )
+                        writer.add_scalar(
+                            f"2.Workers/17.Game_counters_per_second/{name}",
+                            (value - last_game_counters.get(name, 0))
+                            / max(now - last_game_stats_time, 1e-6),
+                            counter,
+                        )
+                    last_game_counters = dict(game_stats["counters"])
+                    last_game_stats_time = now
                 writer.add_scalar(
                     "3.Loss/1.Total_weighted_loss", info["total_loss"], counter
                 )
@@ -365,6 +473,7 @@ class MuZero:
         self.reanalyse_worker = None
         self.replay_buffer_worker = None
         self.shared_storage_worker = None
+        self.inference_server_worker = None
 
     def test(
         self, render=True, opponent=None, muzero_player=None, num_tests=1, num_gpus=0
@@ -435,7 +544,8 @@ class MuZero:
         # Load checkpoint
         if checkpoint_path:
             checkpoint_path = pathlib.Path(checkpoint_path)
-            self.checkpoint = torch.load(checkpoint_path)
+            # Keys added since the checkpoint was saved keep their default values
+            self.checkpoint.update(torch.load(checkpoint_path))
             print(f"\nUsing checkpoint from {checkpoint_path}")
 
         # Load replay buffer
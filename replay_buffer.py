@@ -75,8 +75,9 @@ class ReplayBuffer:
             reward_batch,
             value_batch,
             policy_batch,
+            policy_mask_batch,
             gradient_scale_batch,
-        ) = ([], [], [], [], [], [], [])
+        ) = ([], [], [], [], [], [], [], [])
         weight_batch = [] if self.config.PER else None
 
         for game_id, game_history, game_prob in self.sample_n_games(
@@ -84,7 +85,7 @@ class ReplayBuffer:
         ):
             game_pos, pos_prob = self.sample_position(game_history)
 
-            values, rewards, policies, actions = self.make_target(
+            values, rewards, policies, policy_mask, actions = self.make_target(
                 game_history, game_pos
             )
 
@@ -100,6 +101,7 @@ class ReplayBuffer:
             value_batch.append(values)
             reward_batch.append(rewards)
             policy_batch.append(policies)
+            policy_mask_batch.append(policy_mask)
             gradient_scale_batch.append(
                 [
                     min(
@@ -122,6 +124,7 @@ class ReplayBuffer:
         # value_batch: batch, num_unroll_steps+1
         # reward_batch: batch, num_unroll_steps+1
         # policy_batch: batch, num_unroll_steps+1, len(action_space)
+        # policy_mask_batch: batch, num_unroll_steps+1
         # weight_batch: batch
         # gradient_scale_batch: batch, num_unroll_steps+1
         return (
@@ -132,6 +135,7 @@ class ReplayBuffer:
                 value_batch,
                 reward_batch,
                 policy_batch,
+                policy_mask_batch,
                 weight_batch,
                 gradient_scale_batch,
             ),
@@ -245,6 +249,20 @@ class ReplayBuffer:
             )
 
             value = last_step_value * self.config.discount**self.config.td_steps
+        elif game_history.resign_value is not None and index <= len(
+            game_history.root_values
+        ):
+            # The game ended by a resignation, its last position is bootstrapped with
+            # the value of the resigning player
+            last_index = len(game_history.root_values)
+            last_step_value = (
+                game_history.resign_value
+                if game_history.to_play_history[last_index]
+                == game_history.to_play_history[index]
+                else -game_history.resign_value
+            )
+
+            value = last_step_value * self.config.discount ** (last_index - index)
         else:
             value = 0
 
@@ -263,9 +281,11 @@ class ReplayBuffer:
 
     def make_target(self, game_history, state_index):
         """
-        Generate targets for every unroll steps.
+        Generate targets for every unroll steps. The policy mask is 0 for the policies of
+        the fast searches, which are not trained on.
         """
         target_values, target_rewards, target_policies, actions = [], [], [], []
+        policy_mask = []
         for current_index in range(
             state_index, state_index + self.config.num_unroll_steps + 1
         ):
@@ -275,9 +295,14 @@ class ReplayBuffer:
                 target_values.append(value)
                 target_rewards.append(game_history.reward_history[current_index])
                 target_policies.append(game_history.child_visits[current_index])
+                policy_mask.append(
+                    float(game_history.policy_target_mask[current_index])
+                )
                 actions.append(game_history.action_history[current_index])
             elif current_index == len(game_history.root_values):
-                target_values.append(0)
+                # 0 at the end of a game, the value of the resigning player after a
+                # resignation
+                target_values.append(value)
                 target_rewards.append(game_history.reward_history[current_index])
                 # Uniform policy
                 target_policies.append(
@@ -286,6 +311,7 @@ class ReplayBuffer:
                         for _ in range(len(game_history.child_visits[0]))
                     ]
                 )
+                policy_mask.append(1.0)
                 actions.append(game_history.action_history[current_index])
             else:
                 # States past the end of games are treated as absorbing states
@@ -298,9 +324,10 @@ class ReplayBuffer:
                         for _ in range(len(game_history.child_visits[0]))
                     ]
                 )
+                policy_mask.append(1.0)
                 actions.append(numpy.random.choice(self.config.action_space))
 
-        return target_values, target_rewards, target_policies, actions
+        return target_values, target_rewards, target_policies, policy_mask, actions
 
 
 @ray.remote
@@ -1,3 +1,4 @@
+import functools
 import math
 import time
 
@@ -5,6 +6,7 @@ import numpy
 import ray
 import torch
 
+import inference_server
 import models
 
 
@@ -14,19 +16,36 @@ class SelfPlay:
     Class which run in a dedicated thread to play games and save them to the replay-buffer.
     """
 
-    def __init__(self, initial_checkpoint, Game, config, seed):
+    def __init__(
+        self, initial_checkpoint, Game, config, seed, inference_server_worker=None
+    ):
         self.config = config
         self.game = Game(seed)
+        # Games played in lockstep with self.game, seeded apart from the other workers
+        self.games = [self.game] + [
+            Game(seed + i * (self.config.num_workers + 1))
+            for i in range(1, self.config.games_per_worker)
+        ]
 
         # Fix random generator seed
         numpy.random.seed(seed)
         torch.manual_seed(seed)
 
-        # Initialize the network
-        self.model = models.MuZeroNetwork(self.config)
-        self.model.set_weights(initial_checkpoint["weights"])
-        self.model.to(torch.device("cuda" if self.config.selfplay_on_gpu else "cpu"))
-        self.model.eval()
+        # Initialize the network, or use the one of the inference server
+        self.inference_server_worker = inference_server_worker
+        if self.inference_server_worker:
+            self.model = inference_server.RemoteModel(self.inference_server_worker)
+        else:
+            self.model = models.MuZeroNetwork(self.config)
+            self.model.set_weights(initial_checkpoint["weights"])
+            self.model.to(
+                torch.device("cuda" if self.config.selfplay_on_gpu else "cpu")
+            )
+            self.model.eval()
+
+        self.profiler = SearchProfiler() if self.config.profile_mcts else None
+        # Kept across the moves so that its hidden state pool is reused by every search
+        self.mcts = MCTS(self.config, self.profiler)
 
     def continuous_self_play(self, shared_storage, replay_buffer, test_mode=False):
         while ray.get(
@@ -34,10 +53,19 @@ class SelfPlay:
         ) < self.config.training_steps and not ray.get(
             shared_storage.get_info.remote("terminate")
         ):
-            self.model.set_weights(ray.get(shared_storage.get_info.remote("weights")))
+            # The inference server refreshes its weights by itself
+            if not self.inference_server_worker:
+                self.model.set_weights(
+                    ray.get(shared_storage.get_info.remote("weights"))
+                )
 
             if not test_mode:
-                game_history = self.play_game(
+                resign_threshold = (
+                    ray.get(shared_storage.get_info.remote("resign_threshold"))
+                    if 1 < len(self.config.players)
+                    else None
+                )
+                game_histories = self.play_games(
                     self.config.visit_softmax_temperature_fn(
                         trained_steps=ray.get(
                             shared_storage.get_info.remote("training_step")
@@ -47,9 +75,27 @@ class SelfPlay:
                     False,
                     "self",
                     0,
+                    self.config.games_per_worker,
+                    playout_cap_randomization=True,
+                    resign_threshold=resign_threshold,
                 )
 
-                replay_buffer.save_game.remote(game_history, shared_storage)
+                for game_history in game_histories:
+                    replay_buffer.save_game.remote(game_history, shared_storage)
+                if resign_threshold is not None:
+                    shared_storage.update_resign_stats.remote(
+                        [
+                            record
+                            for game_history in game_histories
+                            if game_history.resign_playout
+                            for record in self.resign_records(game_history)
+                        ],
+                        len(game_histories),
+                        sum(
+                            game_history.resign_value is not None
+                            for game_history in game_histories
+                        ),
+                    )
 
             else:
                 # Take the best action (no exploration) in test mode
@@ -89,6 +135,14 @@ class SelfPlay:
                         }
                     )
 
+            if self.profiler:
+                shared_storage.update_profile.remote(self.profiler.report())
+            game_stats = [
+                stats for stats in (game.stats() for game in self.games) if stats
+            ]
+            if game_stats:
+                shared_storage.update_game_stats.remote(game_stats)
+
             # Managing the self-play / training ratio
             if not test_mode and self.config.self_play_delay:
                 time.sleep(self.config.self_play_delay)
@@ -113,123 +167,331 @@ class SelfPlay:
         """
         Play one game with actions based on the Monte Carlo tree search at each moves.
         """
-        game_history = GameHistory()
-        observation = self.game.reset()
-        game_history.action_history.append(0)
-        game_history.observation_history.append(observation)
-        game_history.reward_history.append(0)
-        game_history.to_play_history.append(self.game.to_play())
+        return self.play_games(
+            temperature, temperature_threshold, render, opponent, muzero_player, 1
+        )[0]
+
+    def play_games(
+        self,
+        temperature,
+        temperature_threshold,
+        render,
+        opponent,
+        muzero_player,
+        num_games,
+        playout_cap_randomization=False,
+        resign_threshold=None,
+    ):
+        """
+        Play num_games games in lockstep with actions based on the Monte Carlo tree search
+        at each moves. The searches of every game waiting for a MuZero move are run
+        together, so each simulation evaluates the model once for all of them.
+        With playout_cap_randomization and fast_num_simulations set, only a
+        full_search_probability fraction of the moves run num_simulations simulations,
+        the others run a fast search and are not used as policy targets.
+        With a resign_threshold, the player to play resigns when the value of the root
+        falls under it, except in a resign_playout_fraction of the games which are played
+        to the end to measure the false resignations.
+        """
+        games = self.games[:num_games]
+        game_histories = []
+        observations = []
+        for game in games:
+            game_history = GameHistory()
+            observation = game.reset()
+            game_history.action_history.append(0)
+            game_history.observation_history.append(observation)
+            game_history.reward_history.append(0)
+            game_history.to_play_history.append(game.to_play())
+            game_history.resign_playout = (
+                resign_threshold is not None
+                and numpy.random.random() < self.config.resign_playout_fraction
+            )
+            game_histories.append(game_history)
+            observations.append(observation)
 
-        done = False
+        dones = [False] * num_games
+        # Search tree and node of the current position of each game, kept to warm start
+        # the next search when reuse_tree is enabled
+        reused_trees = [None] * num_games
 
         if render:
             self.game.render()
 
         with torch.no_grad():
-            while (
-                not done and len(game_history.action_history) <= self.config.max_moves
-            ):
-                assert (
-                    len(numpy.array(observation).shape) == 3
-                ), f"Observation should be 3 dimensionnal instead of {len(numpy.array(observation).shape)} dimensionnal. Got observation of shape: {numpy.array(observation).shape}"
-                assert (
-                    numpy.array(observation).shape == self.config.observation_shape
-                ), f"Observation should match the observation_shape defined in MuZeroConfig. Expected {self.config.observation_shape} but got {numpy.array(observation).shape}."
-                stacked_observations = game_history.get_stacked_observations(
-                    -1, self.config.stacked_observations, len(self.config.action_space)
-                )
-
-                # Choose the action
-                if opponent == "self" or muzero_player == self.game.to_play():
-                    root, mcts_info = MCTS(self.config).run(
+            while True:
+                playing = [
+                    i
+                    for i in range(num_games)
+                    if not dones[i]
+                    and len(game_histories[i].action_history) <= self.config.max_moves
+                ]
+                if not playing:
+                    break
+
+                if self.profiler:
+                    self.profiler.start()
+                stacked_observations = {}
+                for i in playing:
+                    assert (
+                        len(numpy.array(observations[i]).shape) == 3
+                    ), f"Observation should be 3 dimensionnal instead of {len(numpy.array(observations[i]).shape)} dimensionnal. Got observation of shape: {numpy.array(observations[i]).shape}"
+                    assert (
+                        numpy.array(observations[i]).shape
+                        == self.config.observation_shape
+                    ), f"Observation should match the observation_shape defined in MuZeroConfig. Expected {self.config.observation_shape} but got {numpy.array(observations[i]).shape}."
+                    stacked_observations[i] = game_histories[
+                        i
+                    ].get_stacked_observations(
+                        -1,
+                        self.config.stacked_observations,
+                        len(self.config.action_space),
+                    )
+                if self.profiler:
+                    self.profiler.lap("observation_stacking")
+
+                # Choose the actions, the searches of all the games are batched together
+                roots, actions = {}, {}
+                searching = [
+                    i
+                    for i in playing
+                    if opponent == "self" or muzero_player == games[i].to_play()
+                ]
+                if searching:
+                    full_searches = [
+                        not playout_cap_randomization
+                        or self.config.fast_num_simulations is None
+                        or numpy.random.random() < self.config.full_search_probability
+                        for _ in searching
+                    ]
+                    reused_roots = [
+                        self.reused_root(reused_trees[i], games[i].legal_actions())
+                        for i in searching
+                    ]
+                    if self.profiler:
+                        self.profiler.lap("subtree_reuse")
+                    search_roots, mcts_infos = self.mcts.run_batch(
                         self.model,
-                        stacked_observations,
-                        self.game.legal_actions(),
-                        self.game.to_play(),
+                        [stacked_observations[i] for i in searching],
+                        [games[i].legal_actions() for i in searching],
+                        [games[i].to_play() for i in searching],
                         True,
+                        reused_roots,
+                        self.search_deadline([games[i] for i in searching]),
+                        [
+                            self.config.num_simulations
+                            if full_search
+                            else self.config.fast_num_simulations
+                            for full_search in full_searches
+                        ],
                     )
-                    action = self.select_action(
-                        root,
-                        temperature
-                        if not temperature_threshold
-                        or len(game_history.action_history) < temperature_threshold
-                        else 0,
-                    )
+                    for i, root, mcts_info, full_search in zip(
+                        searching, search_roots, mcts_infos, full_searches
+                    ):
+                        if (
+                            resign_threshold is not None
+                            and not game_histories[i].resign_playout
+                            # Keep at least one position to train on
+                            and game_histories[i].root_values
+                            and root.value() < resign_threshold
+                        ):
+                            # The game ends on the position of the resigning player,
+                            # its root value bootstraps the value targets
+                            dones[i] = True
+                            game_histories[i].resign_value = root.value()
+                            if render:
+                                print(f"Player {games[i].to_play()} resigned")
+                            continue
+                        roots[i] = root
+                        root.full_search = full_search
+                        actions[i] = self.select_action(
+                            root,
+                            temperature
+                            if not temperature_threshold
+                            or len(game_histories[i].action_history)
+                            < temperature_threshold
+                            else 0,
+                        )
 
-                    if render:
-                        print(f'Tree depth: {mcts_info["max_tree_depth"]}')
-                        print(
-                            f"Root value for player {self.game.to_play()}: {root.value():.2f}"
+                        if render:
+                            print(f'Tree depth: {mcts_info["max_tree_depth"]}')
+                            print(f'Simulations: {mcts_info["num_simulations"]}')
+                            print(
+                                f"Root value for player {games[i].to_play()}: {root.value():.2f}"
+                            )
+                    if self.profiler:
+                        self.profiler.lap("action_selection")
+
+                for i in playing:
+                    if dones[i]:
+                        continue
+                    game, game_history = games[i], game_histories[i]
+                    if i not in actions:
+                        actions[i], roots[i] = self.select_opponent_action(
+                            opponent, stacked_observations[i], game
                         )
-                else:
-                    action, root = self.select_opponent_action(
-                        opponent, stacked_observations
+                        if self.profiler:
+                            self.profiler.lap("opponent")
+
+                    observations[i], reward, dones[i] = game.step(actions[i])
+                    if self.profiler:
+                        self.profiler.lap("environment")
+
+                    if self.config.reuse_tree:
+                        if roots[i] is not None:
+                            reused_trees[i] = (roots[i], 0)
+                        if reused_trees[i] is not None:
+                            tree, node = reused_trees[i]
+                            child = tree.child(node, actions[i])
+                            reused_trees[i] = (
+                                (tree, child)
+                                if child is not None and tree.expanded(child)
+                                else None
+                            )
+
+                    if render:
+                        print(f"Played action: {game.action_to_string(actions[i])}")
+                        game.render()
+
+                    game_history.store_search_statistics(
+                        roots[i], self.config.action_space
                     )
 
-                observation, reward, done = self.game.step(action)
+                    # Next batch
+                    game_history.action_history.append(actions[i])
+                    game_history.observation_history.append(observations[i])
+                    game_history.reward_history.append(reward)
+                    game_history.to_play_history.append(game.to_play())
+                    if self.profiler:
+                        self.profiler.lap("game_history")
 
-                if render:
-                    print(f"Played action: {self.game.action_to_string(action)}")
-                    self.game.render()
+        return game_histories
 
-                game_history.store_search_statistics(root, self.config.action_space)
+    @staticmethod
+    def resign_records(game_history):
+        """
+        Return the lowest root value of each player of a game with whether the player lost
+        the game, to calibrate the resign threshold on the games played to the end.
+        """
+        rewards, lowest_values = {}, {}
+        for i, player in enumerate(game_history.to_play_history):
+            if 0 < i:
+                # The reward goes to the player who played the action
+                previous_player = game_history.to_play_history[i - 1]
+                rewards[previous_player] = (
+                    rewards.get(previous_player, 0) + game_history.reward_history[i]
+                )
+            if (
+                i < len(game_history.root_values)
+                and game_history.root_values[i] is not None
+            ):
+                lowest_values[player] = min(
+                    lowest_values.get(player, float("inf")),
+                    game_history.root_values[i],
+                )
+        return [
+            (
+                lowest_value,
+                any(
+                    rewards.get(player, 0) < reward
+                    for other_player, reward in rewards.items()
+                    if other_player != player
+                ),
+            )
+            for player, lowest_value in lowest_values.items()
+        ]
 
-                # Next batch
-                game_history.action_history.append(action)
-                game_history.observation_history.append(observation)
-                game_history.reward_history.append(reward)
-                game_history.to_play_history.append(self.game.to_play())
+    def search_deadline(self, games):
+        """
+        Return the time.perf_counter time at which the searches of the games must stop, or
+        None to run num_simulations simulations. The budget of a search is
+        search_time_budget, or a fraction of the remaining game clock if it is shorter.
+        """
+        budget = self.config.search_time_budget
+        if self.config.search_time_fraction:
+            for game in games:
+                time_remaining = game.time_remaining()
+                if time_remaining is not None:
+                    budget = min(
+                        budget if budget is not None else float("inf"),
+                        self.config.search_time_fraction * time_remaining,
+                    )
+        return time.perf_counter() + budget if budget is not None else None
 
-        return game_history
+    def reused_root(self, reused_tree, legal_actions):
+        """
+        Extract the subtree of the current position from the previous search to use it as
+        the root of the next one. Return None to start from a fresh root.
+        """
+        if reused_tree is None:
+            return None
+        tree, node = reused_tree
+        # Another search since this one, of another game or of an opponent, overwrote the
+        # hidden states of the tree
+        if tree.pool_generation != tree.hidden_state_pool.generation:
+            return None
+        root = tree.subtree(
+            node,
+            legal_actions,
+            self.config.num_simulations,
+            self.config.reuse_tree_max_visits,
+        )
+        # The sequential halving schedule counts the visits of the root children from zero
+        if root is not None and self.config.use_gumbel:
+            root.reset_root_children()
+        return root
 
     def close_game(self):
-        self.game.close()
+        for game in self.games:
+            game.close()
 
-    def select_opponent_action(self, opponent, stacked_observations):
+    def select_opponent_action(self, opponent, stacked_observations, game=None):
         """
         Select opponent action for evaluating MuZero level.
         """
+        game = game if game else self.game
         if opponent == "human":
-            root, mcts_info = MCTS(self.config).run(
+            root, mcts_info = self.mcts.run(
                 self.model,
                 stacked_observations,
-                self.game.legal_actions(),
-                self.game.to_play(),
+                game.legal_actions(),
+                game.to_play(),
                 True,
             )
             print(f'Tree depth: {mcts_info["max_tree_depth"]}')
-            print(f"Root value for player {self.game.to_play()}: {root.value():.2f}")
+            print(f"Root value for player {game.to_play()}: {root.value():.2f}")
             print(
-                f"Player {self.game.to_play()} turn. MuZero suggests {self.game.action_to_string(self.select_action(root, 0))}"
+                f"Player {game.to_play()} turn. MuZero suggests {game.action_to_string(self.select_action(root, 0))}"
             )
-            return self.game.human_to_action(), root
+            return game.human_to_action(), root
         elif opponent == "expert":
-            return self.game.expert_agent(), None
+            return game.expert_agent(), None
         elif opponent == "random":
             assert (
-                self.game.legal_actions()
-            ), f"Legal actions should not be an empty array. Got {self.game.legal_actions()}."
-            assert set(self.game.legal_actions()).issubset(
+                game.legal_actions()
+            ), f"Legal actions should not be an empty array. Got {game.legal_actions()}."
+            assert set(game.legal_actions()).issubset(
                 set(self.config.action_space)
             ), "Legal actions should be a subset of the action space."
 
-            return numpy.random.choice(self.game.legal_actions()), None
+            return numpy.random.choice(game.legal_actions()), None
         else:
             raise NotImplementedError(
                 'Wrong argument: "opponent" argument should be "self", "human", "expert" or "random"'
             )
 
     @staticmethod
-    def select_action(node, temperature):
+    def select_action(tree, temperature):
         """
         Select action according to the visit count distribution and the temperature.
         The temperature is changed dynamically with the visit_softmax_temperature function
-        in the config.
+        in the config. The Gumbel root search chooses its action itself.
         """
-        visit_counts = numpy.array(
-            [child.visit_count for child in node.children.values()], dtype="int32"
-        )
-        actions = [action for action in node.children.keys()]
+        if tree.selected_action is not None:
+            return tree.selected_action
+
+        visit_counts = tree.visit_count[tree.children(0)]
+        actions = tree.actions(0)
         if temperature == 0:
             action = actions[numpy.argmax(visit_counts)]
         elif temperature == float("inf"):
@@ -254,8 +516,11 @@ class MCTS:
     reach a leaf node.
     """
 
-    def __init__(self, config):
+    def __init__(self, config, profiler=None):
         self.config = config
+        self.hidden_state_pool = HiddenStatePool()
+        # Optional SearchProfiler timing the phases of the searches
+        self.profiler = profiler
 
     def run(
         self,
@@ -265,6 +530,8 @@ class MCTS:
         to_play,
         add_exploration_noise,
         override_root_with=None,
+        deadline=None,
+        num_simulations=None,
     ):
         """
         At the root of the search tree we use the representation function to obtain a
@@ -272,15 +539,78 @@ class MCTS:
         We then run a Monte Carlo Tree Search using only action sequences and the model
         learned by the network.
         """
-        if override_root_with:
-            root = override_root_with
-            root_predicted_value = None
-        else:
-            root = Node(0)
+        roots, extra_infos = self.run_batch(
+            model,
+            [observation],
+            [legal_actions],
+            [to_play],
+            add_exploration_noise,
+            [override_root_with],
+            deadline,
+            [num_simulations] if num_simulations is not None else None,
+        )
+        return roots[0], extra_infos[0]
+
+    def run_batch(
+        self,
+        model,
+        observations,
+        legal_actions,
+        to_play,
+        add_exploration_noise,
+        override_root_with=None,
+        deadline=None,
+        num_simulations=None,
+    ):
+        """
+        Run the searches of several games in lockstep. Every round selects up to
+        leaf_batch_size leaves in each tree and all the leaves are expanded with a single
+        batched call to the dynamics function, so the cost of a model call is shared by all
+        the leaves of all the games.
+        Arguments are lists with one element per game. If a deadline is given (in
+        time.perf_counter seconds), the searches stop after the first round that ends past
+        it, even before num_simulations simulations. num_simulations gives the number of
+        simulations of each search, config.num_simulations by default.
+        """
+        if self.profiler:
+            self.profiler.start()
+        num_games = len(to_play)
+        if num_simulations is None:
+            num_simulations = [self.config.num_simulations] * num_games
+        roots = list(override_root_with) if override_root_with else [None] * num_games
+        root_predicted_values = [None] * num_games
+
+        # The hidden states of the previous search are overwritten, only the ones of the
+        # given roots are moved at the start of the pool
+        kept_hidden_states = []
+        for root in roots:
+            if root is not None:
+                assert (
+                    root.pool_generation == self.hidden_state_pool.generation
+                ), "The hidden states of a reused root were overwritten by another search."
+                nodes = numpy.flatnonzero(
+                    0 <= root.hidden_state_index[: root.num_nodes]
+                )
+                kept_hidden_states.append(
+                    (
+                        root,
+                        nodes,
+                        root.hidden_state_pool[root.hidden_state_index[nodes]],
+                    )
+                )
+        self.hidden_state_pool.reset()
+        for root, nodes, hidden_states in kept_hidden_states:
+            root.hidden_state_index[nodes] = self.hidden_state_pool.store(
+                hidden_states
+            ) + numpy.arange(len(nodes))
+            root.hidden_state_pool = self.hidden_state_pool
+            root.pool_generation = self.hidden_state_pool.generation
+
+        new_roots = [i for i in range(num_games) if roots[i] is None]
+        if new_roots:
             observation = (
-                torch.tensor(observation)
+                torch.tensor(numpy.array([observations[i] for i in new_roots]))
                 .float()
-                .unsqueeze(0)
                 .to(next(model.parameters()).device)
             )
             (
@@ -289,191 +619,676 @@ class MCTS:
                 policy_logits,
                 hidden_state,
             ) = model.initial_inference(observation)
-            root_predicted_value = models.support_to_scalar(
-                root_predicted_value, self.config.support_size
-            ).item()
-            reward = models.support_to_scalar(reward, self.config.support_size).item()
-            assert (
-                legal_actions
-            ), f"Legal actions should not be an empty array. Got {legal_actions}."
-            assert set(legal_actions).issubset(
-                set(self.config.action_space)
-            ), "Legal actions should be a subset of the action space."
-            root.expand(
-                legal_actions,
-                to_play,
-                reward,
-                policy_logits,
-                hidden_state,
+            if self.profiler:
+                self.profiler.lap("initial_inference")
+            root_predicted_value = (
+                models.support_to_scalar(root_predicted_value, self.config.support_size)
+                .squeeze(-1)
+                .tolist()
             )
-
-        if add_exploration_noise:
-            root.add_exploration_noise(
-                dirichlet_alpha=self.config.root_dirichlet_alpha,
-                exploration_fraction=self.config.root_exploration_fraction,
+            reward = (
+                models.support_to_scalar(reward, self.config.support_size)
+                .squeeze(-1)
+                .tolist()
             )
+            if self.profiler:
+                self.profiler.lap("support_to_scalar")
+            hidden_state_index = self.hidden_state_pool.store(hidden_state)
+            for batch_index, i in enumerate(new_roots):
+                assert legal_actions[
+                    i
+                ], f"Legal actions should not be an empty array. Got {legal_actions[i]}."
+                assert set(legal_actions[i]).issubset(
+                    set(self.config.action_space)
+                ), "Legal actions should be a subset of the action space."
+                roots[i] = Tree(
+                    num_simulations[i],
+                    len(self.config.action_space),
+                    hidden_state_pool=self.hidden_state_pool,
+                )
+                roots[i].expand(
+                    0,
+                    legal_actions[i],
+                    to_play[i],
+                    reward[batch_index],
+                    policy_logits[batch_index : batch_index + 1],
+                    hidden_state_index + batch_index,
+                )
+                root_predicted_values[i] = root_predicted_value[batch_index]
+
+        if self.config.use_gumbel:
+            # Value of the root mixed with the Q-values in the completed Q-values
+            root_values = [
+                root_predicted_values[i]
+                if root_predicted_values[i] is not None
+                else roots[i].value()
+                for i in range(num_games)
+            ]
+            gumbels = [
+                numpy.random.gumbel(size=len(root.actions(0)))
+                if add_exploration_noise
+                else numpy.zeros(len(root.actions(0)))
+                for root in roots
+            ]
+        elif add_exploration_noise:
+            for root in roots:
+                root.add_exploration_noise(
+                    dirichlet_alpha=self.config.root_dirichlet_alpha,
+                    exploration_fraction=self.config.root_exploration_fraction,
+                )
 
-        min_max_stats = MinMaxStats()
-
-        max_tree_depth = 0
-        for _ in range(self.config.num_simulations):
-            virtual_to_play = to_play
-            node = root
-            search_path = [node]
-            current_tree_depth = 0
-
-            while node.expanded():
-                current_tree_depth += 1
-                action, node = self.select_child(node, min_max_stats)
-                search_path.append(node)
+        min_max_stats = [MinMaxStats() for _ in range(num_games)]
+        if self.profiler:
+            self.profiler.lap("expansion")
+
+        max_tree_depth = [0] * num_games
+        simulation_counts = [0] * num_games
+        remaining_simulations = list(num_simulations)
+        # Simulation count and root visit distribution of the last convergence checks
+        visit_distributions = [(0, None)] * num_games
+        while any(remaining_simulations):
+            # Select up to leaf_batch_size leaves in each tree, the pending leaves get a
+            # virtual loss so that the next selections of the round diverge
+            leaf_games, search_paths, actions, virtual_to_plays = [], [], [], []
+            virtual_losses = []
+            for i, tree in enumerate(roots):
+                leaves = set()
+                for _ in range(
+                    min(self.config.leaf_batch_size, remaining_simulations[i])
+                ):
+                    virtual_to_play = to_play[i]
+                    node = 0
+                    search_path = [node]
+                    current_tree_depth = 0
+
+                    while tree.expanded(node):
+                        current_tree_depth += 1
+                        if self.config.use_gumbel and node == 0:
+                            action, node = self.select_root_child_gumbel(
+                                tree,
+                                gumbels[i],
+                                root_values[i],
+                                simulation_counts[i],
+                                num_simulations[i],
+                            )
+                        else:
+                            action, node = self.select_child(
+                                tree, node, min_max_stats[i]
+                            )
+                        search_path.append(node)
+
+                        # Players play turn by turn
+                        if virtual_to_play + 1 < len(self.config.players):
+                            virtual_to_play = self.config.players[virtual_to_play + 1]
+                        else:
+                            virtual_to_play = self.config.players[0]
+
+                    # A leaf already pending is not evaluated twice, the round ends here
+                    if node in leaves:
+                        break
+                    leaves.add(node)
+
+                    leaf_games.append(i)
+                    search_paths.append(search_path)
+                    actions.append([action])
+                    virtual_to_plays.append(virtual_to_play)
+                    max_tree_depth[i] = max(max_tree_depth[i], current_tree_depth)
+                    simulation_counts[i] += 1
+                    remaining_simulations[i] -= 1
+
+                    if 1 < self.config.leaf_batch_size:
+                        virtual_losses.append(
+                            (tree, search_path, tree.value_sum[search_path])
+                        )
+                        self.add_virtual_loss(tree, search_path, min_max_stats[i])
 
-                # Players play turn by turn
-                if virtual_to_play + 1 < len(self.config.players):
-                    virtual_to_play = self.config.players[virtual_to_play + 1]
-                else:
-                    virtual_to_play = self.config.players[0]
+            # Restore the statistics in reverse order to remove exactly the virtual losses
+            for tree, search_path, value_sum in reversed(virtual_losses):
+                tree.visit_count[search_path] -= 1
+                tree.value_sum[search_path] = value_sum
+            if self.profiler:
+                self.profiler.lap("selection")
 
             # Inside the search tree we use the dynamics function to obtain the next hidden
             # state given an action and the previous hidden state
-            parent = search_path[-2]
+            parent_hidden_state = self.hidden_state_pool[
+                [
+                    roots[i].hidden_state_index[search_path[-2]]
+                    for i, search_path in zip(leaf_games, search_paths)
+                ]
+            ]
             value, reward, policy_logits, hidden_state = model.recurrent_inference(
-                parent.hidden_state,
-                torch.tensor([[action]]).to(parent.hidden_state.device),
+                parent_hidden_state,
+                torch.tensor(actions).to(parent_hidden_state.device),
             )
-            value = models.support_to_scalar(value, self.config.support_size).item()
-            reward = models.support_to_scalar(reward, self.config.support_size).item()
-            node.expand(
-                self.config.action_space,
-                virtual_to_play,
-                reward,
-                policy_logits,
-                hidden_state,
+            if self.profiler:
+                self.profiler.lap("recurrent_inference")
+            value = (
+                models.support_to_scalar(value, self.config.support_size)
+                .squeeze(-1)
+                .tolist()
             )
+            reward = (
+                models.support_to_scalar(reward, self.config.support_size)
+                .squeeze(-1)
+                .tolist()
+            )
+            if self.profiler:
+                self.profiler.lap("support_to_scalar")
+            hidden_state_index = self.hidden_state_pool.store(hidden_state)
+            for j, (i, search_path) in enumerate(zip(leaf_games, search_paths)):
+                roots[i].expand(
+                    search_path[-1],
+                    self.config.action_space,
+                    virtual_to_plays[j],
+                    reward[j],
+                    policy_logits[j : j + 1],
+                    hidden_state_index + j,
+                )
+            if self.profiler:
+                self.profiler.lap("expansion")
+
+            for j, (i, search_path) in enumerate(zip(leaf_games, search_paths)):
+                self.backpropagate(
+                    roots[i],
+                    search_path,
+                    value[j],
+                    virtual_to_plays[j],
+                    min_max_stats[i],
+                )
+            if self.profiler:
+                self.profiler.lap("backpropagation")
+
+            # The Gumbel root search needs its whole sequential halving schedule
+            if not self.config.use_gumbel:
+                for i, tree in enumerate(roots):
+                    if remaining_simulations[i] and self.stop_early(
+                        tree,
+                        simulation_counts[i],
+                        remaining_simulations[i],
+                        visit_distributions,
+                        i,
+                    ):
+                        remaining_simulations[i] = 0
+
+            if deadline is not None and deadline <= time.perf_counter():
+                break
+
+        if self.config.use_gumbel:
+            for root, gumbel, root_value in zip(roots, gumbels, root_values):
+                # The action is the survivor of the sequential halving, the policy target
+                # is the improved policy
+                visit_count = root.visit_count[root.children(0)]
+                improved_logits = self.gumbel_improved_logits(root, root_value)
+                scores = numpy.where(
+                    visit_count == visit_count.max(),
+                    gumbel + improved_logits,
+                    -numpy.inf,
+                )
+                root.selected_action = int(root.actions(0)[numpy.argmax(scores)])
+                improved_policy = numpy.exp(improved_logits - improved_logits.max())
+                root.improved_policy = improved_policy / improved_policy.sum()
+            if self.profiler:
+                self.profiler.lap("action_selection")
+
+        if self.profiler:
+            for i, root in enumerate(roots):
+                self.profiler.add_tree(root.num_nodes, max_tree_depth[i])
+
+        extra_infos = [
+            {
+                "max_tree_depth": max_tree_depth[i],
+                "root_predicted_value": root_predicted_values[i],
+                "num_simulations": simulation_counts[i],
+            }
+            for i in range(num_games)
+        ]
+        return roots, extra_infos
+
+    def stop_early(
+        self, tree, num_simulations, remaining_simulations, visit_distributions, i
+    ):
+        """
+        Whether the search of a tree can stop before its remaining simulations: when the
+        most visited root action can no longer be overtaken, or when the root visit
+        distribution has converged since the last check. visit_distributions[i] keeps the
+        simulation count and the distribution of the last check.
+        """
+        visit_count = tree.visit_count[tree.children(0)]
+        if self.config.stop_when_decided:
+            if len(visit_count) == 1:
+                return True
+            second, first = numpy.partition(visit_count, -2)[-2:]
+            if remaining_simulations < first - second:
+                return True
+
+        if self.config.visit_convergence_tolerance is not None:
+            checked_at, previous_distribution = visit_distributions[i]
+            if checked_at + self.config.visit_convergence_interval <= num_simulations:
+                visit_distribution = visit_count / visit_count.sum()
+                visit_distributions[i] = (num_simulations, visit_distribution)
+                if (
+                    previous_distribution is not None
+                    and numpy.abs(visit_distribution - previous_distribution).sum()
+                    < self.config.visit_convergence_tolerance
+                ):
+                    return True
 
-            self.backpropagate(search_path, value, virtual_to_play, min_max_stats)
-
-            max_tree_depth = max(max_tree_depth, current_tree_depth)
-
-        extra_info = {
-            "max_tree_depth": max_tree_depth,
-            "root_predicted_value": root_predicted_value,
-        }
-        return root, extra_info
+        return False
 
-    def select_child(self, node, min_max_stats):
+    def select_child(self, tree, node, min_max_stats):
         """
-        Select the child with the highest UCB score.
+        Select the child with the highest UCB score, ties are broken randomly.
         """
-        max_ucb = max(
-            self.ucb_score(node, child, min_max_stats)
-            for action, child in node.children.items()
+        ucb_scores = self.ucb_score(tree, node, min_max_stats)
+        action = numpy.random.choice(numpy.flatnonzero(ucb_scores == ucb_scores.max()))
+        child = tree.child(node, action)
+        if child is None:
+            child = tree.add_child(node, action)
+        return action, child
+
+    def select_root_child_gumbel(
+        self, tree, gumbel, root_value, simulation_index, num_simulations
+    ):
+        """
+        Select the root child of a simulation of the sequential halving. Among the actions
+        with the number of visits expected by the schedule, it is the one with the highest
+        gumbel + logits + sigma(completed Q). Before the first halving, this visits the top
+        gumbel_max_considered_actions actions sampled without replacement.
+        """
+        actions = tree.actions(0)
+        visit_count = tree.visit_count[tree.children(0)]
+        num_considered_actions = min(
+            self.config.gumbel_max_considered_actions, len(visit_count)
         )
-        action = numpy.random.choice(
-            [
-                action
-                for action, child in node.children.items()
-                if self.ucb_score(node, child, min_max_stats) == max_ucb
-            ]
+        considered_visit = considered_visits(num_considered_actions, num_simulations)[
+            simulation_index
+        ]
+        scores = gumbel + self.gumbel_improved_logits(tree, root_value)
+        considered = visit_count == considered_visit
+        if considered.any():
+            scores = numpy.where(considered, scores, -numpy.inf)
+        action = actions[numpy.argmax(scores)]
+        child = tree.child(0, action)
+        if child is None:
+            child = tree.add_child(0, action)
+        return action, child
+
+    def gumbel_improved_logits(self, tree, root_value):
+        """
+        Logits of the improved policy at the root: logits + sigma(completed Q). The Q-values
+        of the unvisited actions are completed with a mix of the value of the root and of the
+        Q-values of the visited actions, then rescaled to [0, 1] and scaled by the visits.
+        """
+        children = tree.children(0)
+        visit_count = tree.visit_count[children]
+        prior = numpy.maximum(
+            tree.prior[0, tree.actions(0)], numpy.finfo("float64").tiny
+        )
+        value = tree.value_sum[children] / numpy.maximum(visit_count, 1)
+        q_value = tree.reward[children] + self.config.discount * (
+            value if len(self.config.players) == 1 else -value
+        )
+
+        visited = 0 < visit_count
+        weighted_q_value = (
+            (prior[visited] * q_value[visited]).sum() / prior[visited].sum()
+            if visited.any()
+            else 0
+        )
+        mixed_value = (root_value + visit_count.sum() * weighted_q_value) / (
+            visit_count.sum() + 1
+        )
+        completed_q_value = numpy.where(visited, q_value, mixed_value)
+        completed_q_value = (completed_q_value - completed_q_value.min()) / max(
+            completed_q_value.max() - completed_q_value.min(), 1e-8
+        )
+
+        sigma = (
+            (self.config.gumbel_c_visit + visit_count.max())
+            * self.config.gumbel_c_scale
+            * completed_q_value
         )
-        return action, node.children[action]
+        return numpy.log(prior) + sigma
 
-    def ucb_score(self, parent, child, min_max_stats):
+    def ucb_score(self, tree, parent, min_max_stats):
         """
         The score for a node is based on its value, plus an exploration bonus based on the prior.
+        The scores of all the actions of the parent are computed at once, -inf for the
+        illegal ones.
         """
         pb_c = (
             math.log(
-                (parent.visit_count + self.config.pb_c_base + 1) / self.config.pb_c_base
+                (tree.visit_count[parent] + self.config.pb_c_base + 1)
+                / self.config.pb_c_base
             )
             + self.config.pb_c_init
         )
-        pb_c *= math.sqrt(parent.visit_count) / (child.visit_count + 1)
-
-        prior_score = pb_c * child.prior
+        ucb_scores = pb_c * math.sqrt(tree.visit_count[parent]) * tree.prior[parent]
+
+        # Only the few children already created have statistics
+        actions = numpy.flatnonzero(0 <= tree.child_ids[parent])
+        children = tree.child_ids[parent, actions]
+        visit_count = tree.visit_count[children]
+        prior_score = (
+            pb_c
+            * (math.sqrt(tree.visit_count[parent]) / (visit_count + 1))
+            * tree.prior[parent, actions]
+        )
 
-        if child.visit_count > 0:
-            # Mean value Q
-            value_score = min_max_stats.normalize(
-                child.reward
+        # Mean value Q, only for the visited children
+        value = tree.value_sum[children] / numpy.maximum(visit_count, 1)
+        value_score = numpy.where(
+            0 < visit_count,
+            min_max_stats.normalize(
+                tree.reward[children]
                 + self.config.discount
-                * (child.value() if len(self.config.players) == 1 else -child.value())
-            )
-        else:
-            value_score = 0
+                * (value if len(self.config.players) == 1 else -value)
+            ),
+            0,
+        )
+        ucb_scores[actions] = prior_score + value_score
 
-        return prior_score + value_score
+        return numpy.where(tree.legal[parent], ucb_scores, -numpy.inf)
 
-    def backpropagate(self, search_path, value, to_play, min_max_stats):
+    def add_virtual_loss(self, tree, search_path, min_max_stats):
+        """
+        Count a pending evaluation as a visit of every node of the path, with the lowest
+        value seen in the search for the player choosing the node.
+        """
+        search_path = numpy.array(search_path)
+        lowest_value = (
+            min_max_stats.minimum if min_max_stats.minimum < float("inf") else 0
+        )
+        value = (lowest_value - tree.reward[search_path[1:]]) / self.config.discount
+        tree.visit_count[search_path] += 1
+        tree.value_sum[search_path[1:]] += (
+            value if len(self.config.players) == 1 else -value
+        )
+
+    def backpropagate(self, tree, search_path, value, to_play, min_max_stats):
         """
         At the end of a simulation, we propagate the evaluation all the way up the tree
         to the root.
         """
+        search_path = numpy.array(search_path)
         if len(self.config.players) == 1:
-            for node in reversed(search_path):
-                node.value_sum += value
-                node.visit_count += 1
-                min_max_stats.update(node.reward + self.config.discount * node.value())
-
-                value = node.reward + self.config.discount * value
-
+            value_signs = [1] * len(search_path)
+            reward_signs = value_signs
         elif len(self.config.players) == 2:
-            for node in reversed(search_path):
-                node.value_sum += value if node.to_play == to_play else -value
-                node.visit_count += 1
-                min_max_stats.update(node.reward + self.config.discount * -node.value())
-
-                value = (
-                    -node.reward if node.to_play == to_play else node.reward
-                ) + self.config.discount * value
-
+            value_signs = numpy.where(
+                tree.to_play[search_path] == to_play, 1, -1
+            ).tolist()
+            reward_signs = [-sign for sign in value_signs]
         else:
             raise NotImplementedError("More than two player mode not implemented.")
 
+        # Discounted value seen by every node of the path, walking up from the leaf
+        values = []
+        for reward, value_sign, reward_sign in zip(
+            reversed(tree.reward[search_path].tolist()),
+            reversed(value_signs),
+            reversed(reward_signs),
+        ):
+            values.append(value_sign * value)
+            value = reward_sign * reward + self.config.discount * value
+
+        tree.value_sum[search_path] += values[::-1]
+        tree.visit_count[search_path] += 1
+        node_values = tree.value_sum[search_path] / tree.visit_count[search_path]
+        min_max_stats.update(
+            tree.reward[search_path]
+            + self.config.discount
+            * (node_values if len(self.config.players) == 1 else -node_values)
+        )
+
+
+@functools.lru_cache(maxsize=None)
+def considered_visits(num_considered_actions, num_simulations):
+    """
+    Schedule of the sequential halving: the number of visits that the root child selected
+    at each simulation must have. The simulations are split evenly between the phases and
+    the number of considered actions is halved after each phase, down to 2.
+    """
+    if num_considered_actions <= 1:
+        return tuple(range(num_simulations))
+    log2_max = math.ceil(math.log2(num_considered_actions))
+    sequence = []
+    visits = [0] * num_considered_actions
+    num_considered = num_considered_actions
+    while len(sequence) < num_simulations:
+        num_extra_visits = max(1, num_simulations // (log2_max * num_considered))
+        for _ in range(num_extra_visits):
+            sequence.extend(visits[:num_considered])
+            for i in range(num_considered):
+                visits[i] += 1
+        num_considered = max(2, num_considered // 2)
+    return tuple(sequence[:num_simulations])
+
+
+class Tree:
+    """
+    Search tree stored as a struct of arrays. The statistics of the nodes live in numpy
+    arrays preallocated for a whole search and indexed by node id, the root is the node 0.
+    An expanded node stores the priors of the whole action space in a row and its
+    children are only created when the selection first visits them.
+    """
 
-class Node:
-    def __init__(self, prior):
-        self.visit_count = 0
-        self.to_play = -1
-        self.prior = prior
-        self.value_sum = 0
-        self.children = {}
-        self.hidden_state = None
-        self.reward = 0
+    def __init__(
+        self,
+        num_simulations,
+        action_space_size,
+        num_reused_nodes=0,
+        hidden_state_pool=None,
+    ):
+        # Every simulation adds at most one node. The last node is never used, its empty
+        # statistics are read through the child -1 of the actions not visited yet
+        capacity = num_reused_nodes + num_simulations + 2
+        self.action_space_size = action_space_size
+        self.visit_count = numpy.zeros(capacity, dtype="int64")
+        self.value_sum = numpy.zeros(capacity, dtype="float64")
+        self.reward = numpy.zeros(capacity, dtype="float64")
+        self.to_play = numpy.full(capacity, -1, dtype="int64")
+        # Action leading to the node from its parent
+        self.action = numpy.zeros(capacity, dtype="int64")
+        # Rows of the expanded nodes, indexed by action
+        self.prior = numpy.zeros((capacity, action_space_size), dtype="float64")
+        self.legal = numpy.zeros((capacity, action_space_size), dtype="bool")
+        self.child_ids = numpy.full((capacity, action_space_size), -1, dtype="int64")
+        # Row of the hidden state of the expanded nodes in the hidden state pool
+        self.hidden_state_index = numpy.full(capacity, -1, dtype="int64")
+        self.hidden_state_pool = (
+            hidden_state_pool if hidden_state_pool is not None else HiddenStatePool()
+        )
+        # The hidden state rows are only valid until the next reset of the pool
+        self.pool_generation = self.hidden_state_pool.generation
+        self.num_nodes = 1
+        # Set by the Gumbel root search
+        self.selected_action = None
+        self.improved_policy = None
+        # Cleared for the fast searches of the playout cap randomization
+        self.full_search = True
+
+    def expanded(self, node):
+        return 0 <= self.hidden_state_index[node]
+
+    def actions(self, node):
+        """
+        Return the actions of an expanded node.
+        """
+        return numpy.flatnonzero(self.legal[node])
 
-    def expanded(self):
-        return len(self.children) > 0
+    def children(self, node):
+        """
+        Return the children of an expanded node in the order of its actions, -1 for the
+        actions not visited yet.
+        """
+        return self.child_ids[node, self.legal[node]]
 
-    def value(self):
-        if self.visit_count == 0:
+    def child(self, node, action):
+        """
+        Return the child of node reached with action or None if there is none.
+        """
+        child = self.child_ids[node, action]
+        return child if 0 <= child else None
+
+    def add_child(self, node, action):
+        child = self.num_nodes
+        self.num_nodes += 1
+        self.action[child] = action
+        self.child_ids[node, action] = child
+        return child
+
+    def hidden_state(self, node):
+        index = self.hidden_state_index[node]
+        return self.hidden_state_pool[index : index + 1]
+
+    def value(self, node=0):
+        if self.visit_count[node] == 0:
             return 0
-        return self.value_sum / self.visit_count
+        return float(self.value_sum[node] / self.visit_count[node])
 
-    def expand(self, actions, to_play, reward, policy_logits, hidden_state):
+    def expand(self, node, actions, to_play, reward, policy_logits, hidden_state_index):
         """
         We expand a node using the value, reward and policy prediction obtained from the
-        neural network.
+        neural network. Its hidden state has already been stored in the hidden state pool.
         """
-        self.to_play = to_play
-        self.reward = reward
-        self.hidden_state = hidden_state
-
-        policy_values = torch.softmax(
-            torch.tensor([policy_logits[0][a] for a in actions]), dim=0
-        ).tolist()
-        policy = {a: policy_values[i] for i, a in enumerate(actions)}
-        for action, p in policy.items():
-            self.children[action] = Node(p)
+        self.to_play[node] = to_play
+        self.reward[node] = reward
+        self.hidden_state_index[node] = hidden_state_index
+
+        self.legal[node, actions] = True
+        illegal = torch.from_numpy(~self.legal[node]).to(policy_logits.device)
+        self.prior[node] = (
+            torch.softmax(policy_logits[0].masked_fill(illegal, -float("inf")), dim=0)
+            .cpu()
+            .numpy()
+        )
 
     def add_exploration_noise(self, dirichlet_alpha, exploration_fraction):
         """
         At the start of each search, we add dirichlet noise to the prior of the root to
         encourage the search to explore new actions.
         """
-        actions = list(self.children.keys())
+        actions = self.actions(0)
         noise = numpy.random.dirichlet([dirichlet_alpha] * len(actions))
         frac = exploration_fraction
-        for a, n in zip(actions, noise):
-            self.children[a].prior = self.children[a].prior * (1 - frac) + n * frac
+        self.prior[0, actions] = self.prior[0, actions] * (1 - frac) + noise * frac
+
+    def reset_root_children(self):
+        """
+        Clear the statistics of the root children while keeping the mean value of the root
+        and the statistics deeper in the tree.
+        """
+        value = self.value(0)
+        children = self.children(0)
+        self.visit_count[children] = 0
+        self.value_sum[children] = 0
+        self.visit_count[0] = 1
+        self.value_sum[0] = value
+
+    def subtree(self, node, legal_actions, num_simulations, max_visits=None):
+        """
+        Copy the subtree of an expanded node in a new tree rooted at this node, with room
+        for num_simulations new simulations. Only the children of the legal actions are kept
+        at the root and the visit counts can be scaled down to at most max_visits at the root.
+        """
+        legal = numpy.zeros(self.action_space_size, dtype="bool")
+        legal[legal_actions] = True
+        legal &= self.legal[node]
+        if not legal.any():
+            return None
+
+        # Gather the nodes level by level
+        frontier = self.child_ids[node, legal]
+        frontier = frontier[0 <= frontier]
+        nodes = [numpy.array([node]), frontier]
+        while len(frontier):
+            frontier = self.child_ids[frontier].ravel()
+            frontier = frontier[0 <= frontier]
+            nodes.append(frontier)
+        nodes = numpy.concatenate(nodes)
+        new_ids = numpy.full(len(self.visit_count), -1, dtype="int64")
+        new_ids[nodes] = numpy.arange(len(nodes))
+
+        tree = Tree(
+            num_simulations,
+            self.action_space_size,
+            len(nodes),
+            self.hidden_state_pool,
+        )
+        tree.num_nodes = len(nodes)
+        tree.pool_generation = self.pool_generation
+        for name in (
+            "visit_count",
+            "value_sum",
+            "to_play",
+            "action",
+            "prior",
+            "legal",
+            "hidden_state_index",
+        ):
+            getattr(tree, name)[: len(nodes)] = getattr(self, name)[nodes]
+        tree.reward[1 : len(nodes)] = self.reward[nodes[1:]]
+        tree.child_ids[: len(nodes)] = new_ids[self.child_ids[nodes]]
+
+        # The root keeps its mean value over the visits of its legal children
+        tree.legal[0] = legal
+        tree.child_ids[0, ~legal] = -1
+        tree.prior[0, ~legal] = 0
+        tree.prior[0] /= tree.prior[0].sum()
+        visit_count = tree.visit_count[tree.children(0)].sum() + 1
+        tree.value_sum[0] = tree.value(0) * visit_count
+        tree.visit_count[0] = visit_count
+
+        if max_visits is not None and max_visits < tree.visit_count[0]:
+            # Scale down the visit counts while keeping the mean values
+            visit_count = tree.visit_count[: len(nodes)]
+            scaled_visit_count = visit_count * max_visits // tree.visit_count[0]
+            tree.value_sum[: len(nodes)] *= scaled_visit_count / numpy.maximum(
+                visit_count, 1
+            )
+            tree.visit_count[: len(nodes)] = scaled_visit_count
+
+        return tree
+
+
+class HiddenStatePool:
+    """
+    Preallocated tensor holding the hidden states of the expanded nodes, one row per node.
+    Its rows are reused by every search and it only grows when a search needs more.
+    """
+
+    def __init__(self):
+        self.states = None
+        self.size = 0
+        # Number of resets, the rows stored before the last one may be overwritten
+        self.generation = 0
+
+    def reset(self):
+        self.size = 0
+        self.generation += 1
+
+    def store(self, hidden_state):
+        """
+        Copy a batch of hidden states in the pool and return the row of the first one.
+        """
+        start = self.size
+        self.size += len(hidden_state)
+        if self.states is None or len(self.states) < self.size:
+            states = torch.empty(
+                (2 * self.size, *hidden_state.shape[1:]),
+                dtype=hidden_state.dtype,
+                device=hidden_state.device,
+            )
+            if self.states is not None:
+                states[:start] = self.states[:start]
+            self.states = states
+        self.states[start : self.size] = hidden_state
+        return start
+
+    def __getitem__(self, index):
+        return self.states[index]
 
 
 class GameHistory:
@@ -487,24 +1302,38 @@ class GameHistory:
         self.reward_history = []
         self.to_play_history = []
         self.child_visits = []
+        # Whether the policy of each child_visits is a training target, the moves of
+        # the fast searches of the playout cap randomization are not
+        self.policy_target_mask = []
         self.root_values = []
         self.reanalysed_predicted_root_values = None
+        # Value of the last position for its player when the game ended by a resignation
+        self.resign_value = None
+        # Whether the game was played to the end although its players could resign
+        self.resign_playout = False
         # For PER
         self.priorities = None
         self.game_priority = None
 
+    def __setstate__(self, state):
+        # Games pickled in a replay buffer saved by an older version miss the newer
+        # attributes, they keep their defaults
+        self.__init__()
+        # Before the playout cap randomization every policy was a training target
+        self.policy_target_mask = [True] * len(state["child_visits"])
+        self.__dict__.update(state)
+
     def store_search_statistics(self, root, action_space):
         # Turn visit count from root into a policy
         if root is not None:
-            sum_visits = sum(child.visit_count for child in root.children.values())
-            self.child_visits.append(
-                [
-                    root.children[a].visit_count / sum_visits
-                    if a in root.children
-                    else 0
-                    for a in action_space
-                ]
-            )
+            visit_counts = root.visit_count[root.children(0)]
+            child_visits = numpy.zeros(len(action_space))
+            if root.improved_policy is not None:
+                child_visits[root.actions(0)] = root.improved_policy
+            else:
+                child_visits[root.actions(0)] = visit_counts / visit_counts.sum()
+            self.child_visits.append(child_visits.tolist())
+            self.policy_target_mask.append(root.full_search)
 
             self.root_values.append(root.value())
         else:
@@ -550,6 +1379,48 @@ class GameHistory:
         return stacked_observations
 
 
+class SearchProfiler:
+    """
+    Record the cumulative time and number of calls of the phases of the searches and of
+    the games, and the sizes and depths of the search trees. A phase lasts from the
+    previous call to start or lap until its own call to lap. With a GPU, the inferences
+    run asynchronously so their time is mostly counted in support_to_scalar.
+    """
+
+    def __init__(self):
+        self.time = {}
+        self.calls = {}
+        self.tree_sizes = []
+        self.tree_depths = []
+        self.last_lap = time.perf_counter()
+
+    def start(self):
+        self.last_lap = time.perf_counter()
+
+    def lap(self, phase):
+        now = time.perf_counter()
+        self.time[phase] = self.time.get(phase, 0) + now - self.last_lap
+        self.calls[phase] = self.calls.get(phase, 0) + 1
+        self.last_lap = now
+
+    def add_tree(self, size, depth):
+        self.tree_sizes.append(size)
+        self.tree_depths.append(depth)
+
+    def report(self):
+        """
+        Return the statistics recorded since the last report and reset them.
+        """
+        profile = {
+            "time": self.time,
+            "calls": self.calls,
+            "tree_sizes": self.tree_sizes,
+            "tree_depths": self.tree_depths,
+        }
+        self.__init__()
+        return profile
+
+
 class MinMaxStats:
     """
     A class that holds the min-max values of the tree.
@@ -560,8 +1431,9 @@ class MinMaxStats:
         self.minimum = float("inf")
 
     def update(self, value):
-        self.maximum = max(self.maximum, value)
-        self.minimum = min(self.minimum, value)
+        # Accept a single value or an array of values
+        self.maximum = max(self.maximum, numpy.max(value))
+        self.minimum = min(self.minimum, numpy.min(value))
 
     def normalize(self, value):
         if self.maximum > self.minimum:
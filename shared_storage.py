@@ -1,5 +1,6 @@
 import copy
 
+import numpy
 import ray
 import torch
 
@@ -38,3 +39,85 @@ class SharedStorage:
             self.current_checkpoint.update(keys)
         else:
             raise TypeError
+
+    def update_profile(self, profile):
+        """
+        Add the search profile reported by a self-play worker to the one of all the workers.
+        Only the last tree sizes and depths are kept for the histograms.
+        """
+        total = self.current_checkpoint.get("mcts_profile") or {
+            "time": {},
+            "calls": {},
+            "tree_sizes": [],
+            "tree_depths": [],
+        }
+        for key in ["time", "calls"]:
+            for phase, value in profile[key].items():
+                total[key][phase] = total[key].get(phase, 0) + value
+        for key in ["tree_sizes", "tree_depths"]:
+            total[key] = (total[key] + profile[key])[-10000:]
+        self.current_checkpoint["mcts_profile"] = total
+
+    def update_game_stats(self, reports):
+        """
+        Add the statistics reported by the games of a self-play worker to the ones of all
+        the games: the timing histograms, their total times and the event counters.
+        """
+        total = self.current_checkpoint.get("game_stats") or {
+            "timings": {},
+            "totals": {},
+            "counters": {},
+            "bucket_edges": None,
+        }
+        for report in reports:
+            total["bucket_edges"] = report["bucket_edges"]
+            for name, counts in report["timings"].items():
+                previous = total["timings"].get(name, [0] * len(counts))
+                total["timings"][name] = [a + b for a, b in zip(previous, counts)]
+            for key in ["totals", "counters"]:
+                for name, value in report[key].items():
+                    total[key][name] = total[key].get(name, 0) + value
+        self.current_checkpoint["game_stats"] = total
+
+    def update_resign_stats(self, records, num_games, num_resigned_games):
+        """
+        Add the resignations of a batch of self-play games and the records of the games
+        played to the end, then tune the resign threshold to keep the false resignations
+        under resign_false_positive_rate. A record is the lowest root value of a player
+        with whether the player lost. Only the last 1000 records are kept.
+        """
+        stats = self.current_checkpoint.get("resign_stats") or {
+            "num_games": 0,
+            "num_resigned_games": 0,
+            "records": [],
+            "false_positive_rate": None,
+        }
+        stats["num_games"] += num_games
+        stats["num_resigned_games"] += num_resigned_games
+        stats["records"] = (stats["records"] + records)[-1000:]
+
+        threshold = self.current_checkpoint["resign_threshold"]
+        if stats["records"]:
+            lowest_values = numpy.array([value for value, _ in stats["records"]])
+            not_lost = numpy.array([not lost for _, lost in stats["records"]])
+            if self.config.resign_false_positive_rate is not None and 100 <= len(
+                stats["records"]
+            ):
+                # Highest threshold under which the players which would have resigned
+                # did not lose at most resign_false_positive_rate of their games
+                order = numpy.argsort(lowest_values)
+                false_positive_rates = numpy.cumsum(not_lost[order]) / numpy.arange(
+                    1, len(order) + 1
+                )
+                candidates = numpy.flatnonzero(
+                    false_positive_rates[:-1] <= self.config.resign_false_positive_rate
+                )
+                threshold = float(
+                    lowest_values[order[candidates[-1] + 1 if len(candidates) else 0]]
+                )
+            resigned = lowest_values < threshold
+            if resigned.any():
+                stats["false_positive_rate"] = float(not_lost[resigned].mean())
+
+        self.current_checkpoint["resign_threshold"] = threshold
+        self.current_checkpoint["resign_stats"] = stats
@@ -0,0 +1,71 @@
+"""
+Unit tests for the poker hand evaluator.
+Tests hand ranking, the vectorized evaluation and the Monte Carlo equity estimates.
+"""
+
+import pytest
+import numpy as np
+import sys
+import os
+
+# Add games directory to path for imports
+sys.path.append(os.path.join(os.path.dirname(__file__), '../../games'))
+
+from poker_evaluator import (evaluate, evaluate_hands, equity, hand_category, cards_to_indices,
+                             HIGH_CARD, STRAIGHT, STRAIGHT_FLUSH)
+
+
+class TestPokerEvaluator:
+    """Test suite for hand evaluation."""
+    
+    def test_category_order(self):
+        """Test the ranking of the hand categories."""
+        hands = [
+            ['2s', '7d', '9h', 'Jc', 'Kd', '3c', '4h'],  # High card
+            ['2s', '2d', '9h', 'Jc', 'Kd', '3c', '4h'],  # Pair
+            ['2s', '2d', '9h', '9c', 'Kd', '3c', '4h'],  # Two pair
+            ['2s', '2d', '2h', '9c', 'Kd', '3c', '4h'],  # Three of a kind
+            ['As', '2d', '3h', '4c', '5d', 'Jc', 'Qh'],  # Wheel straight
+            ['6s', '2d', '3h', '4c', '5d', 'Jc', 'Qh'],  # Six-high straight
+            ['2h', '7h', '9h', 'Jh', 'Kh', '3c', '4d'],  # Flush
+            ['2s', '2d', '2h', '9c', '9d', '3c', '4h'],  # Full house
+            ['2s', '2d', '2h', '2c', 'Kd', '3c', '4h'],  # Four of a kind
+            ['Ah', '2h', '3h', '4h', '5h', 'Jc', 'Qd'],  # Straight flush
+        ]
+        values = [evaluate(hand) for hand in hands]
+        
+        assert values == sorted(values)
+        assert len(set(values)) == len(values)
+        assert hand_category(values[0]) == HIGH_CARD
+        assert hand_category(values[4]) == STRAIGHT
+        assert hand_category(values[-1]) == STRAIGHT_FLUSH
+    
+    def test_kickers(self):
+        """Test that equal categories are decided by the kickers and split pots are detected."""
+        board = ['Kd', 'Kc', '8h', '5s', '2d']
+        
+        assert evaluate(['Ah', '3c'] + board) > evaluate(['Qh', 'Jc'] + board)
+        assert evaluate(['4h', '3c'] + board) == evaluate(['4d', '3s'] + board)
+        # Two pair with the third pair as the kicker
+        assert evaluate(['8s', '5d'] + board) == evaluate(['8c', '5c'] + board)
+        assert evaluate(['8s', '5d', 'Qh', 'Qs', 'Kd', 'Kc', '2d']) > evaluate(['8s', '5d', 'Jh', 'Js', 'Kd', 'Kc', 'Ad'])
+    
+    def test_vectorized_matches_single(self):
+        """Test that evaluating many hands at once gives the values of single hands."""
+        rng = np.random.default_rng(0)
+        deck = np.array(['23456789TJQKA'[rank] + 'shdc'[suit] for rank in range(13) for suit in range(4)])
+        for num_cards in (5, 6, 7):
+            hands = deck[rng.random((500, 52)).argsort(axis=1)[:, :num_cards]]
+            values = evaluate_hands(np.stack([cards_to_indices(list(hand)) for hand in hands]))
+            assert values.tolist() == [evaluate(list(hand)) for hand in hands]
+    
+    def test_equity(self):
+        """Test Monte Carlo equity estimates."""
+        rng = np.random.default_rng(0)
+        
+        assert equity(['As', 'Ad'], [], num_samples=2000, rng=rng) == pytest.approx(0.85, abs=0.03)
+        assert equity(['7s', '2d'], [], num_samples=2000, rng=rng) == pytest.approx(0.35, abs=0.03)
+        # Nobody can beat or tie a royal flush
+        assert equity(['As', 'Ks'], ['Qs', 'Js', 'Ts', '2h', '3d'], num_samples=100, rng=rng) == 1.0
+        # A board nobody can improve on splits the pot
+        assert equity(['2c', '3d'], ['Ah', 'Kh', 'Qh', 'Jh', 'Th'], num_samples=100, rng=rng) == 0.5
@@ -12,7 +12,8 @@ from unittest.mock import patch, MagicMock
 # Add games directory to path for imports
 sys.path.append(os.path.join(os.path.dirname(__file__), '../../games'))
 
-from poker_game import PokerGame
+from poker_game import PokerGame, encode_observation, encode_observations, replay_betting
+from poker_socket import PokerSocket, AsyncPokerSocket
 from mocks.mock_engine import MockPokerEngine, MockPokerScenarios
 
 
@@ -68,6 +69,30 @@ class TestPokerGame:
         # Check bankroll delta
         assert obs[146] == 50/400.0  # Normalized by starting stack
     
+    def test_observation_encoding_batch(self):
+        """Test that batched encoding matches single messages and reuses its buffer."""
+        messages = [
+            {'time_remaining': 300.0, 'player_index': 1, 'hole_cards': ['As', 'Kh'], 'action_history': ['C', 'R10']},
+            {},
+            {'board_cards': ['9h', 'Td', 'Jc'], 'bankroll_delta': -20},
+        ]
+        
+        batch = encode_observations(messages)
+        assert batch.shape == (3, 200)
+        assert batch.dtype == np.float32
+        for row, message in zip(batch, messages):
+            np.testing.assert_array_equal(row, self.game._encode_observation(message))
+        
+        # Writing into a buffer clears what the previous messages left in it
+        buffer = np.ones((4, 200), dtype=np.float32)
+        assert encode_observations(messages[::-1], out=buffer) is buffer
+        np.testing.assert_array_equal(buffer[:3], batch[::-1])
+        assert np.all(buffer[3] == 1.0)
+        
+        row = np.ones(200, dtype=np.float32)
+        assert encode_observation({}, out=row) is row
+        assert np.all(row == 0)
+    
     def test_card_to_index_conversion(self):
         """Test card string to index conversion."""
         # Test valid cards
@@ -102,6 +127,127 @@ class TestPokerGame:
         assert len(actions) == 103
         assert actions == list(range(103))
     
+    def test_legal_actions_from_message(self):
+        """Test legal actions derived from the betting of the hand."""
+        # Small blind to act preflop: fold, call or raise to 4-400
+        self.game._update_legal_actions({'player_index': 0, 'hole_cards': ['As', 'Kh'], 'action_history': []})
+        actions = self.game.legal_actions()
+        assert actions[:2] == [0, 1] and 2 not in actions
+        assert self.game.raise_bounds == (4, 400)
+        assert self.game._action_to_poker_code(3) == 'R4'  # Below the minimum raise
+        amounts = [int(self.game._action_to_poker_code(action)[1:]) for action in actions[2:]]
+        assert amounts[0] == 4 and amounts[-1] == 400
+        assert len(set(amounts)) == len(amounts)
+        
+        # Big blind after the small blind called: check or raise
+        self.game._update_legal_actions({'player_index': 1, 'hole_cards': ['As', 'Kh'], 'action_history': ['C']})
+        assert self.game.legal_actions()[0] == 2 and 0 not in self.game.legal_actions()
+        
+        # Small blind after the big blind checked the flop: check or bet from the big blind
+        self.game._update_legal_actions({'player_index': 0, 'hole_cards': ['As', 'Kh'],
+                                         'board_cards': ['2c', '7d', 'Jh'], 'action_history': ['C', 'K', 'K']})
+        assert self.game.legal_actions()[0] == 2 and 0 not in self.game.legal_actions()
+        assert self.game.raise_bounds == (2, 398)
+        
+        # Big blind on the turn after a bet and a call on the flop
+        self.game._update_legal_actions({'player_index': 1, 'hole_cards': ['As', 'Kh'],
+                                         'board_cards': ['2c', '7d', 'Jh', 'Qs'], 'action_history': ['C', 'K', 'R10', 'C']})
+        assert self.game.legal_actions()[0] == 2
+        assert self.game.raise_bounds == (2, 388)
+        
+        # Facing a turn bet after the flop was checked through: fold, call or raise
+        self.game._update_legal_actions({'player_index': 0, 'hole_cards': ['As', 'Kh'],
+                                         'board_cards': ['2c', '7d', 'Jh', 'Qs'], 'action_history': ['C', 'K', 'K', 'K', 'R8']})
+        assert self.game.legal_actions()[:2] == [0, 1]
+        assert self.game.raise_bounds == (16, 398)
+        
+        # Facing an all-in there is nothing left to raise
+        self.game._update_legal_actions({'player_index': 1, 'hole_cards': ['As', 'Kh'], 'action_history': ['R400']})
+        assert self.game.legal_actions() == [0, 1]
+        assert self.game.raise_bounds is None
+        
+        # End of round lines need no decision, unknown histories allow every action
+        self.game._update_legal_actions({'bankroll_delta': 2, 'action_history': []})
+        assert self.game.legal_actions() == [2]
+        self.game._update_legal_actions({'player_index': 0, 'hole_cards': ['As', 'Kh'], 'action_history': ['C']})
+        assert self.game.legal_actions() == list(range(103))
+    
+    def test_expert_agent(self):
+        """Test the equity-based expert agent on clear decisions."""
+        # Aces raise preflop
+        self.game.current_message = {'player_index': 0, 'hole_cards': ['As', 'Ad'], 'action_history': []}
+        self.game._update_legal_actions(self.game.current_message)
+        action = self.game.expert_agent()
+        assert action >= 3 and action in self.game.legal_actions()
+        
+        # The worst hand folds to an all-in and checks when it is free
+        self.game.current_message = {'player_index': 1, 'hole_cards': ['7s', '2d'], 'action_history': ['R400']}
+        self.game._update_legal_actions(self.game.current_message)
+        assert self.game.expert_agent() == 0
+        self.game.current_message = {'player_index': 1, 'hole_cards': ['7s', '2d'], 'action_history': ['C']}
+        self.game._update_legal_actions(self.game.current_message)
+        assert self.game.expert_agent() == 2
+    
+    def test_equity_features(self):
+        """Test the optional equity and hand category features."""
+        message = {'hole_cards': ['As', 'Ks'], 'board_cards': ['Qs', 'Js', 'Ts']}
+        assert np.all(self.game._encode_observation(message)[147:149] == 0)
+        
+        game = PokerGame(seed=0, training_mode=True, equity_features=True)
+        obs = game._encode_observation(message)
+        assert obs[147] == 1.0  # Royal flush
+        assert obs[148] == 1.0
+        obs = game._encode_observation({'hole_cards': ['7s', '2d']})
+        assert 0.2 < obs[147] < 0.5
+        assert obs[148] == 0.0
+        game.close()
+    
+    def test_replay_betting(self):
+        """Test the street, pips and stacks replayed from the actions of a hand."""
+        state = replay_betting(['R6', 'C', 'K', 'R10'], 3)
+        assert state['pips'] == [10, 0]
+        assert state['stacks'] == [384, 394]
+        assert state['active'] == 1
+        assert state['pot'] == 22
+        
+        assert replay_betting(['R6', 'C'], 0) is None  # The flop should have been dealt
+        
+        # Postflop streets start with the big blind and end after two checks or a call
+        state = replay_betting(['C', 'K', 'K'], 3)
+        assert state['active'] == 0
+        assert state['pips'] == [0, 0]
+        state = replay_betting(['C', 'K', 'K', 'K'], 4)
+        assert state['active'] == 1
+        assert state['pips'] == [0, 0]
+        assert state['stacks'] == [398, 398]
+        assert replay_betting(['C', 'K', 'K', 'K'], 3) is None
+        state = replay_betting(['C', 'K', 'R10', 'C'], 4)
+        assert state['active'] == 1
+        assert state['pips'] == [0, 0]
+        assert state['stacks'] == [388, 388]
+        assert state['pot'] == 24
+        state = replay_betting(['C', 'K', 'K', 'K', 'R20', 'C', 'K', 'K'], 5)
+        assert state is None  # Both checked the river, the hand is over
+        state = replay_betting(['C', 'K', 'K', 'K', 'R20', 'C', 'K'], 5)
+        assert state['active'] == 0
+        assert state['stacks'] == [378, 378]
+        assert replay_betting(['C', 'F'], 0) is None
+    
+    def test_time_remaining(self):
+        """Test game clock tracking from engine messages."""
+        assert self.game.time_remaining() is None
+        
+        self.game._update_clock({'time_remaining': 300.0})
+        remaining = self.game.time_remaining()
+        assert 299.0 < remaining <= 300.0
+        
+        # The clock keeps running after the message
+        self.game.clock_received_at -= 10.0
+        assert self.game.time_remaining() <= 290.0
+        
+        self.game._update_clock({'time_remaining': None})
+        assert self.game.time_remaining() is None
+    
     def test_action_to_string(self):
         """Test action number to string conversion."""
         assert self.game.action_to_string(0) == "Fold"
@@ -136,6 +282,57 @@ class TestPokerGame:
         assert done is False
         mock_socket.send_action.assert_called_with('C')
     
+    def test_reset_keeps_running_match(self):
+        """Test that reset continues on the running engine instead of restarting it."""
+        mock_socket = MagicMock()
+        mock_socket.is_connected.return_value = True
+        mock_socket.is_engine_running.return_value = True
+        mock_socket.receive_message.return_value = {
+            'time_remaining': 580.0,
+            'hole_cards': ['Ah', 'Kh'],
+            'game_over': False
+        }
+        
+        self.game.poker_socket = mock_socket
+        self.game.match_over = False
+        
+        obs = self.game.reset()
+        
+        assert obs[2 + 49] == 1.0  # Ah
+        mock_socket.start_engine.assert_not_called()
+        mock_socket.close.assert_not_called()
+        
+        # A finished match starts a new engine
+        self.game.match_over = True
+        self.game.reset()
+        mock_socket.start_engine.assert_called_once()
+        mock_socket.connect.assert_called_once()
+    
+    def test_hands_per_episode(self):
+        """Test that episodes can end with the hand while the match goes on."""
+        game = PokerGame(training_mode=True, hands_per_episode=1)
+        mock_socket = MagicMock()
+        mock_socket.send_action.return_value = True
+        mock_socket.receive_message.return_value = {
+            'time_remaining': 590.0,
+            'bankroll_delta': -2,
+            'game_over': False
+        }
+        game.poker_socket = mock_socket
+        game.match_over = False
+        
+        obs, reward, done = game.step(0)
+        
+        assert done is True
+        assert reward == -2/400.0
+        assert game.match_over is False
+    
+    def test_rejects_async_socket(self):
+        """Test that the game refuses the asyncio transport, whose coroutines it cannot await."""
+        assert not isinstance(AsyncPokerSocket(), PokerSocket)
+        with pytest.raises(TypeError):
+            PokerGame(poker_socket=AsyncPokerSocket())
+    
     def test_step_connection_failure(self):
         """Test step method when socket connection fails."""
         # Mock failed socket
@@ -164,6 +361,28 @@ class TestPokerGameIntegration:
         if self.mock_engine:
             self.mock_engine.stop()
     
+    def test_reset_answers_round_over_line(self):
+        """Test that reset answers the end of round line before reading the next hand of the match."""
+        for response in ["T600.000 P0 H2s,3h", "D-1 Y00", "T599.000 P1 H4c,5d"]:
+            self.mock_engine.add_response(response)
+        assert self.mock_engine.start()
+        
+        game = PokerGame(training_mode=True, hands_per_episode=1, poker_socket=PokerSocket(port=self.mock_engine.port))
+        with patch.object(game.poker_socket, 'start_engine', return_value=True), \
+                patch.object(game.poker_socket, 'is_engine_running', return_value=True):
+            game.reset()
+            game.poker_socket.socket_connection.settimeout(2.0)
+            _, reward, done = game.step(0)
+            assert done is True
+            assert reward == -1/400.0
+            
+            obs = game.reset()
+        
+        assert game.current_message['hole_cards'] == ['4c', '5d']
+        assert obs[1] == 1.0  # Player index of the second hand
+        assert self.mock_engine.get_received_actions() == ['F', 'K']
+        game.close()
+    
     @pytest.mark.integration  
     @patch.object(PokerSocket, 'start_engine')
     @patch.object(PokerSocket, 'connect')
@@ -0,0 +1,196 @@
+"""
+Unit tests for PokerSimulator.
+Tests the engine message protocol, betting rules and bounties of the in-process engine.
+"""
+
+import pytest
+import sys
+import os
+
+# Add games directory to path for imports
+sys.path.append(os.path.join(os.path.dirname(__file__), '../../games'))
+
+from poker_simulator import PokerSimulator, SimulatedPokerSocket
+from poker_game import PokerGame
+
+
+def play_match(simulator: PokerSimulator, action: str) -> list:
+    """Answer every line of a match with the same action and return the lines."""
+    lines = []
+    simulator.start_match()
+    while True:
+        line = simulator.readline()
+        if not line:
+            return lines
+        lines.append(line.strip())
+        simulator.write(action + '\n')
+
+
+class TestPokerSimulator:
+    """Test suite for the in-process poker engine."""
+    
+    def test_deterministic(self):
+        """Test that a seed replays the same match."""
+        first = play_match(PokerSimulator({'NUM_ROUNDS': 20}, seed=7), 'C')
+        second = play_match(PokerSimulator({'NUM_ROUNDS': 20}, seed=7), 'C')
+        other = play_match(PokerSimulator({'NUM_ROUNDS': 20}, seed=8), 'C')
+        
+        assert first == second
+        assert first != other
+    
+    def test_fold_loses_blind(self):
+        """Test that folding preflop loses the posted blind."""
+        lines = play_match(PokerSimulator({'NUM_ROUNDS': 2}, seed=0), 'F')
+        
+        # Small blind on the first round, big blind after the calling opponent on the second
+        assert lines[0].startswith('T600.000 P0 H')
+        # The opponent wins more when it hits its bounty, our own hit is only reported
+        assert lines[1] in ('D-1 Y00', 'D-1 Y10', 'D-11 Y01', 'D-11 Y11')
+        assert lines[2].startswith('T600.000 P1 H') and lines[2].endswith(' C')
+        assert lines[3].startswith('T600.000 P1 H') and ' B' in lines[3]  # Folding is a check when possible
+        assert lines[-1].endswith('Q')
+    
+    def test_match_length(self):
+        """Test that the match ends with Q after NUM_ROUNDS rounds."""
+        simulator = PokerSimulator({'NUM_ROUNDS': 5}, seed=1)
+        lines = play_match(simulator, 'C')
+        
+        deltas = [line for line in lines if line.startswith('D')]
+        assert len(deltas) == 5
+        assert lines[-1].endswith('Q')
+        assert simulator.running is False
+        assert simulator.bankroll == sum(int(line.split()[0][1:]) for line in deltas)
+    
+    def test_raise_bounds(self):
+        """Test the raise limits and that illegal raises become checks or folds."""
+        simulator = PokerSimulator({'NUM_ROUNDS': 1}, seed=0)
+        simulator.start_match()
+        simulator.readline()
+        
+        legal, (min_raise, max_raise) = simulator.legal_actions()
+        assert legal == {'F', 'C', 'R'}
+        assert (min_raise, max_raise) == (4, 400)
+        
+        simulator.write('R401\n')
+        assert simulator.readline().strip() in ('D-1 Y00 Q', 'D-1 Y10 Q', 'D-11 Y01 Q', 'D-11 Y11 Q')
+    
+    def test_checks_end_postflop_streets(self):
+        """Test that two checks after the flop deal the next street, the big blind acting first."""
+        simulator = PokerSimulator({'NUM_ROUNDS': 1}, seed=0)
+        simulator.start_match()
+        simulator.readline()
+        simulator.write('C\n')
+        
+        # The big blind checks the preflop option and is the first to check the flop
+        line = simulator.readline().strip()
+        assert len(simulator.board) == 3
+        assert line.endswith(' C K K')
+        
+        simulator.write('K\n')
+        line = simulator.readline().strip()
+        assert len(simulator.board) == 4
+        assert line.split()[3] == 'B' + ','.join(simulator.board)
+        assert line.endswith(' C K K K K')
+    
+    def test_all_in_runs_out_board(self):
+        """Test that an all-in call deals the whole board and goes to showdown."""
+        simulator = PokerSimulator({'NUM_ROUNDS': 1}, seed=3)
+        simulator.start_match()
+        simulator.readline()
+        simulator.write('R400\n')
+        
+        line = simulator.readline().strip()
+        assert len(simulator.board) == 5
+        assert line.split()[1].startswith('O')
+        assert line.endswith('Q')
+    
+    def test_bounty_payout(self):
+        """Test that a winner holding the bounty rank wins the ratio plus the constant."""
+        simulator = PokerSimulator({'NUM_ROUNDS': 1}, seed=0)
+        simulator.start_match()
+        simulator.readline()
+        simulator.bounties = [0, 0]
+        simulator.hands = [['4s', '3s'], ['Kd', 'Qd']]
+        simulator.write('F\n')
+        
+        # The opponent wins our small blind without its bounty rank
+        assert simulator.readline().strip() == 'D-1 Y00 Q'
+        
+        simulator.start_match()
+        simulator.readline()
+        simulator.bounties = [12, 12]
+        simulator.hands = [['Kc', 'Qc'], ['As', '3h']]
+        simulator.write('F\n')
+        assert simulator.readline().strip() == f'D{-(int(1.5 * 1) + 10)} Y01 Q'
+    
+    def test_losing_bounty_hit(self):
+        """Test that the bounty hit of the loser is reported but not paid."""
+        simulator = PokerSimulator({'NUM_ROUNDS': 1}, seed=0)
+        simulator.start_match()
+        simulator.readline()
+        simulator.bounties = [0, 12]
+        simulator.hands = [['2s', '3s'], ['Kd', 'Qd']]
+        simulator.write('F\n')
+        
+        # We fold holding our bounty rank, the opponent wins our small blind without its own
+        assert simulator.readline().strip() == 'D-1 Y10 Q'
+
+
+class TestSimulatedPokerGame:
+    """Test suite for PokerGame playing against the simulator."""
+    
+    def test_play_match(self):
+        """Test a whole match through the PokerGame interface without an engine."""
+        game = PokerGame(seed=0, training_mode=True, simulated=True)
+        game.poker_socket.simulator.num_rounds = 10
+        assert isinstance(game.poker_socket, SimulatedPokerSocket)
+        
+        obs = game.reset()
+        assert obs.shape == (200,)
+        
+        total_reward = 0.0
+        done = False
+        steps = 0
+        while not done:
+            obs, reward, done = game.step(1)
+            total_reward += reward
+            steps += 1
+            assert steps < 1000
+        
+        assert game.match_over is True
+        assert total_reward == pytest.approx(game.poker_socket.simulator.bankroll / 400.0)
+        game.close()
+    
+    def test_hands_per_episode(self):
+        """Test that episodes end with the hand and continue on the running match."""
+        game = PokerGame(seed=0, training_mode=True, hands_per_episode=1, simulated=True)
+        game.reset()
+        
+        for episode in range(3):
+            done = False
+            while not done:
+                _, reward, done = game.step(0)
+            game.reset()
+        
+        assert game.poker_socket.simulator.round_num == 3
+        assert game.match_over is False
+        game.close()
+    
+    def test_bridge_stats(self):
+        """Test the timings and counters reported by the game."""
+        game = PokerGame(seed=0, training_mode=True, hands_per_episode=3, simulated=True)
+        game.reset()
+        done = False
+        steps = 0
+        while not done:
+            _, _, done = game.step(1)
+            steps += 1
+        
+        stats = game.stats()
+        assert stats['counters'] == {'hands': 3}
+        assert sum(stats['timings']['round_trip']) == steps
+        assert sum(stats['timings']['parse']) == steps + 1
+        assert sum(stats['timings']['encode']) == steps + 1
+        assert sum(stats['timings']['engine_startup']) == 1
+        assert game.stats()['counters'] == {}
+        game.close()
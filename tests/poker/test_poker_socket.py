@@ -3,7 +3,13 @@ Unit tests for PokerSocket class.
 Tests socket communication, message parsing, and engine process management.
 """
 
+import asyncio
 import pytest
+import re
+import shutil
+import socket
+import tempfile
+import threading
 import time
 import os
 from unittest.mock import patch, MagicMock
@@ -12,7 +18,8 @@ import sys
 # Add games directory to path for imports
 sys.path.append(os.path.join(os.path.dirname(__file__), '../../games'))
 
-from poker_socket import PokerSocket
+from poker_socket import (PokerSocket, AsyncPokerSocket, EnginePool, BridgeStats, CARD_INDEX, LATENCY_BUCKETS,
+                         STDOUT_LIMIT, find_free_port, parse_message)
 from mocks.mock_engine import MockPokerEngine, MockPokerScenarios
 
 
@@ -66,6 +73,71 @@ class TestPokerSocket:
         assert message['bankroll_delta'] == -50
         assert message['game_over'] is True
     
+    def test_parse_message_clauses(self):
+        """Test the clause dispatch of parse_message on every clause type."""
+        message = parse_message("D13 O6d,4d Y10 T12.500 P1 HKh,4c B7c,9s,3s C R10 K F Z9 Q")
+        
+        assert message['bankroll_delta'] == 13
+        assert message['opponent_hand'] == ['6d', '4d']
+        assert message['bounty_hits'] == '10'
+        assert message['time_remaining'] == 12.5
+        assert message['player_index'] == 1
+        assert message['hole_cards'] == ['Kh', '4c']
+        assert message['board_cards'] == ['7c', '9s', '3s']
+        assert message['action_history'] == ['C', 'R10', 'K', 'F']
+        assert message['game_over'] is True
+        
+        # Unknown clauses and extra letters are ignored
+        message = parse_message("Qx Cx  H")
+        assert message['game_over'] is False
+        assert message['action_history'] == []
+        assert message['hole_cards'] == []
+        
+        assert CARD_INDEX['2s'] == 0
+        assert CARD_INDEX['Ac'] == 51
+        assert len(set(CARD_INDEX.values())) == 52
+    
+    def test_bridge_stats(self):
+        """Test the timing histograms and counters of the bridge."""
+        stats = BridgeStats()
+        stats.record('round_trip', 0.002)
+        stats.record('round_trip', 0.003)
+        stats.record('round_trip', 100.0)
+        stats.count('timeouts')
+        stats.count('hands', 3)
+        
+        report = stats.report()
+        counts = report['timings']['round_trip']
+        assert len(counts) == len(LATENCY_BUCKETS) + 1
+        assert sum(counts) == 3
+        assert counts[-1] == 1  # Beyond the last bucket edge
+        assert report['totals']['round_trip'] == pytest.approx(100.005)
+        assert report['counters'] == {'timeouts': 1, 'hands': 3}
+        assert report['bucket_edges'] == LATENCY_BUCKETS
+        
+        # Reporting resets the statistics
+        assert stats.report()['timings'] == {}
+    
+    def test_round_trip_and_failure_stats(self):
+        """Test that the socket records round trips, parsing and connection failures."""
+        mock_socketfile = MagicMock()
+        mock_socketfile.readline.return_value = "T600.000 P0 H7s,8s"
+        self.poker_socket.socketfile = mock_socketfile
+        
+        assert self.poker_socket.send_action('C')
+        self.poker_socket.receive_message()
+        self.poker_socket.receive_message()
+        
+        mock_socketfile.readline.side_effect = socket.timeout("timed out")
+        assert self.poker_socket.receive_message() is None
+        self.poker_socket.socketfile = None
+        assert not self.poker_socket.connect(port=find_free_port())
+        
+        report = self.poker_socket.bridge_stats.report()
+        assert sum(report['timings']['round_trip']) == 1  # Only the message answering the action
+        assert sum(report['timings']['parse']) == 2
+        assert report['counters'] == {'timeouts': 1, 'connection_failures': 1}
+    
     def test_action_encoding(self):
         """Test action encoding to poker protocol format."""
         mock_socketfile = MagicMock()
@@ -90,6 +162,32 @@ class TestPokerSocket:
         assert result is False
         assert not self.poker_socket.is_connected()
     
+    def test_connect_waits_for_engine(self):
+        """Test that connect retries until the engine listens."""
+        engine = MockPokerEngine(port=12348)
+        engine.add_response("T600.000 P0 H2s,3h")
+        starter = threading.Timer(0.3, engine.start)
+        starter.start()
+        
+        try:
+            start = time.perf_counter()
+            assert self.poker_socket.connect(port=12348, wait=5.0)
+            assert self.poker_socket.is_connected()
+            assert time.perf_counter() - start < 5.0
+            
+            message = self.poker_socket.receive_message()
+            assert message['hole_cards'] == ['2s', '3h']
+        finally:
+            starter.join()
+            engine.stop()
+    
+    def test_connect_wait_timeout(self):
+        """Test that connect gives up once the wait is over."""
+        start = time.perf_counter()
+        assert self.poker_socket.connect(port=12349, wait=0.2) is False
+        assert not self.poker_socket.is_connected()
+        assert time.perf_counter() - start < 2.0
+    
     def test_config_file_creation(self):
         """Test training config file generation."""
         config_overrides = {
@@ -143,6 +241,238 @@ class TestPokerSocket:
         assert 'F' in received_actions
 
 
+FAKE_ENGINE = """
+import socket
+import time
+from training_config import PORT
+
+server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+time.sleep(0.2)  # Slow startup
+server.bind(('localhost', PORT))
+server.listen(1)
+connection, _ = server.accept()
+socketfile = connection.makefile('rw')
+socketfile.write('T600.000 P0 H2s,3h\\n')
+socketfile.flush()
+socketfile.readline()
+"""
+
+
+class TestEnginePool:
+    """Test suite for isolated engines run in parallel."""
+    
+    def setup_method(self):
+        """Set up a fake engine directory."""
+        self.engine_path = tempfile.mkdtemp()
+        with open(os.path.join(self.engine_path, 'engine.py'), 'w') as f:
+            f.write(FAKE_ENGINE)
+        self.log_dir = tempfile.mkdtemp()
+        self.pool = None
+    
+    def teardown_method(self):
+        """Stop the engines and remove the fake engine and log directories."""
+        if self.pool:
+            self.pool.close()
+        shutil.rmtree(self.engine_path, ignore_errors=True)
+        shutil.rmtree(self.log_dir, ignore_errors=True)
+    
+    def test_isolated_configs(self):
+        """Test that every socket writes its config to its own directory with its own port."""
+        sockets = [PokerSocket(engine_path=self.engine_path, log_dir=self.log_dir) for _ in range(2)]
+        config_paths = [poker_socket._create_training_config() for poker_socket in sockets]
+        
+        assert config_paths[0] != config_paths[1]
+        assert sockets[0].port != sockets[1].port
+        for poker_socket, config_path in zip(sockets, config_paths):
+            assert os.path.dirname(config_path) == poker_socket.work_dir
+            with open(config_path, 'r') as f:
+                assert f'PORT = {poker_socket.port}' in f.read()
+        
+        # Temporary working directories are removed on close
+        for poker_socket, config_path in zip(sockets, config_paths):
+            poker_socket.close()
+            assert not os.path.exists(config_path)
+    
+    def test_game_logs_outlive_engine(self):
+        """Test that the game logs are written to the log directory, which close keeps."""
+        poker_socket = PokerSocket(engine_path=self.engine_path, log_dir=self.log_dir)
+        with open(poker_socket._create_training_config(), 'r') as f:
+            game_log = re.search(r'GAME_LOG_FILENAME = "(.*)"', f.read()).group(1)
+        
+        assert os.path.dirname(game_log) == self.log_dir
+        assert str(poker_socket.port) in os.path.basename(game_log)
+        
+        # The engine writes its log with a .txt extension
+        with open(game_log + '.txt', 'w') as f:
+            f.write('Round #1\n')
+        poker_socket.close()
+        assert os.path.exists(game_log + '.txt')
+    
+    @pytest.mark.integration
+    def test_pool_restarts_crashed_engine(self):
+        """Test that the health check replaces a crashed engine."""
+        self.pool = EnginePool(2, engine_path=self.engine_path, ready_timeout=10.0, log_dir=self.log_dir)
+        assert self.pool.start()
+        assert self.pool.check_health() == 0
+        
+        crashed = self.pool.sockets[0]
+        crashed.engine_process.kill()
+        crashed.engine_process.wait()
+        assert not self.pool.is_healthy(crashed)
+        
+        assert self.pool.check_health() == 1
+        assert self.pool.num_restarts == 1
+        assert self.pool.is_healthy(crashed)
+        
+        poker_socket = self.pool.acquire(timeout=1.0)
+        message = poker_socket.receive_message()
+        assert message['hole_cards'] == ['2s', '3h']
+        self.pool.release(poker_socket)
+    
+    @pytest.mark.integration
+    def test_health_check_skips_acquired_engine(self):
+        """Test that the health check leaves an engine in a game alone, even once it looks unhealthy."""
+        self.pool = EnginePool(2, engine_path=self.engine_path, ready_timeout=10.0, log_dir=self.log_dir)
+        assert self.pool.start()
+        
+        busy = self.pool.acquire(timeout=1.0)
+        engine_process = busy.engine_process
+        assert busy.receive_message()['hole_cards'] == ['2s', '3h']
+        assert busy.send_action('C')
+        # The engine ends its match while the game still holds the socket
+        engine_process.wait()
+        
+        assert self.pool.check_health() == 0
+        assert self.pool.num_restarts == 0
+        assert busy.engine_process is engine_process
+        
+        # Once released, the finished engine is restarted by the next health check
+        self.pool.release(busy)
+        assert self.pool.check_health() == 1
+        assert self.pool.is_healthy(busy)
+
+
+NOISY_ENGINE = """
+for i in range(3000):
+    print(f'line {i}')
+"""
+
+
+async def serve_hand(reader: asyncio.StreamReader, writer: asyncio.StreamWriter, actions: list) -> None:
+    """Play one hand as the engine: deal, read the action, send the result."""
+    writer.write(b'T600.000 P0 H2s,3h\n')
+    await writer.drain()
+    actions.append((await reader.readline()).decode().strip())
+    writer.write(b'D2 Y00 Q\n')
+    await writer.drain()
+    writer.close()
+
+
+async def play_hand(poker_socket: AsyncPokerSocket, action: str) -> list:
+    """Play one hand as the player and return the messages."""
+    first = await poker_socket.receive_message()
+    assert await poker_socket.send_action(action)
+    return [first, await poker_socket.receive_message()]
+
+
+class TestAsyncPokerSocket:
+    """Test suite for the asyncio transport."""
+    
+    def setup_method(self):
+        """Set up a fake engine directory."""
+        self.engine_path = tempfile.mkdtemp()
+        with open(os.path.join(self.engine_path, 'engine.py'), 'w') as f:
+            f.write(FAKE_ENGINE)
+    
+    def teardown_method(self):
+        """Remove the fake engine directory."""
+        shutil.rmtree(self.engine_path, ignore_errors=True)
+    
+    def test_concurrent_unix_connections(self):
+        """Test one event loop playing on several Unix-domain socket connections at once."""
+        async def run():
+            sockets = [AsyncPokerSocket(engine_path=self.engine_path, unix_socket=True) for _ in range(3)]
+            actions = []
+            servers = []
+            for poker_socket in sockets:
+                config_path = poker_socket._create_training_config()
+                with open(config_path, 'r') as f:
+                    assert f'SOCKET_PATH = "{poker_socket.unix_path}"' in f.read()
+                servers.append(await asyncio.start_unix_server(
+                    lambda reader, writer: serve_hand(reader, writer, actions), path=poker_socket.unix_path))
+            
+            assert all([await poker_socket.connect() for poker_socket in sockets])
+            hands = await asyncio.gather(*(play_hand(poker_socket, code)
+                                           for poker_socket, code in zip(sockets, ['F', 'C', 'K'])))
+            
+            for server in servers:
+                server.close()
+            for poker_socket in sockets:
+                await poker_socket.close()
+                assert poker_socket.work_dir is None
+            return hands, actions
+        
+        hands, actions = asyncio.run(run())
+        assert sorted(actions) == ['C', 'F', 'K']
+        for first, last in hands:
+            assert first['hole_cards'] == ['2s', '3h']
+            assert last['bankroll_delta'] == 2
+            assert last['game_over'] is True
+    
+    def test_socketpair(self):
+        """Test the transport over one end of a socketpair."""
+        async def run():
+            player_end, engine_end = socket.socketpair()
+            actions = []
+            poker_socket = AsyncPokerSocket(engine_path=self.engine_path)
+            assert await poker_socket.connect(sock=player_end)
+            reader, writer = await asyncio.open_connection(sock=engine_end)
+            engine = asyncio.ensure_future(serve_hand(reader, writer, actions))
+            hand = await play_hand(poker_socket, 'R10')
+            await engine
+            await poker_socket.close()
+            return hand, actions
+        
+        (first, last), actions = asyncio.run(run())
+        assert actions == ['R10']
+        assert first['player_index'] == 0
+        assert last['bankroll_delta'] == 2
+    
+    @pytest.mark.integration
+    def test_engine_process(self):
+        """Test starting an engine and connecting over TCP once it listens."""
+        async def run():
+            poker_socket = AsyncPokerSocket(engine_path=self.engine_path)
+            assert await poker_socket.start_engine()
+            assert await poker_socket.connect(wait=10.0)
+            assert poker_socket.is_connected() and poker_socket.is_engine_running()
+            message = await poker_socket.receive_message()
+            await poker_socket.close()
+            assert not poker_socket.is_connected()
+            return message
+        
+        assert asyncio.run(run())['hole_cards'] == ['2s', '3h']
+    
+    def test_bounded_stdout(self):
+        """Test that only the last engine output lines are kept."""
+        with open(os.path.join(self.engine_path, 'engine.py'), 'w') as f:
+            f.write(NOISY_ENGINE)
+        
+        async def run():
+            poker_socket = AsyncPokerSocket(engine_path=self.engine_path)
+            assert await poker_socket.start_engine()
+            await poker_socket.engine_process.wait()
+            await poker_socket.stdout_task
+            lines = poker_socket.get_stdout_lines()
+            await poker_socket.close()
+            return lines
+        
+        lines = asyncio.run(run())
+        assert len(lines) == STDOUT_LIMIT
+        assert lines[-1] == 'line 2999'
+
+
 class TestPokerSocketEdgeCases:
     """Test edge cases and error conditions."""
     
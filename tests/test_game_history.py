@@ -0,0 +1,67 @@
+"""
+Unit tests for GameHistory.
+Tests that games pickled in replay buffers saved by older versions still make targets.
+"""
+
+import os
+import pickle
+import sys
+
+# Add the repository root to path for imports
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import self_play
+import replay_buffer
+from games.tictactoe import MuZeroConfig
+
+
+def played_history(num_moves=4):
+    """Return a GameHistory of a short tictactoe game with uniform policies."""
+    game_history = self_play.GameHistory()
+    for move in range(num_moves + 1):
+        game_history.observation_history.append(None)
+        game_history.action_history.append(move)
+        game_history.reward_history.append(0)
+        game_history.to_play_history.append(move % 2)
+    game_history.child_visits = [[1 / 9] * 9 for _ in range(num_moves)]
+    game_history.policy_target_mask = [True] * num_moves
+    game_history.root_values = [0.5] * num_moves
+    return game_history
+
+
+def old_history(*missing):
+    """Pickle and load a history without the given attributes, like an older replay buffer."""
+    game_history = played_history()
+    for name in missing:
+        delattr(game_history, name)
+    return pickle.loads(pickle.dumps(game_history))
+
+
+def make_target(game_history):
+    """Make the targets of the first position with a tictactoe replay buffer."""
+    # The class of the Ray actor, used in-process
+    buffer = replay_buffer.ReplayBuffer.__ray_metadata__.modified_class(
+        {"num_played_games": 0, "num_played_steps": 0}, {}, MuZeroConfig()
+    )
+    return buffer.make_target(game_history, 0)
+
+
+class TestGameHistory:
+    """Test suite for loading pickled game histories."""
+
+    def test_missing_policy_target_mask(self):
+        """Test that every policy of an older history is a training target."""
+        game_history = old_history("policy_target_mask")
+
+        assert game_history.policy_target_mask == [True] * 4
+        _, _, _, policy_mask, _ = make_target(game_history)
+        assert policy_mask[:4] == [1.0] * 4
+
+    def test_missing_resignation(self):
+        """Test that an older history makes the targets of a game played to the end."""
+        game_history = old_history("resign_value", "resign_playout")
+
+        assert game_history.resign_value is None
+        assert game_history.resign_playout is False
+        target_values, _, _, _, _ = make_target(game_history)
+        assert len(target_values) == MuZeroConfig().num_unroll_steps + 1
@@ -132,6 +132,7 @@ class Trainer:
             target_value,
             target_reward,
             target_policy,
+            target_policy_mask,
             weight_batch,
             gradient_scale_batch,
         ) = batch
@@ -150,12 +151,14 @@ class Trainer:
         target_value = torch.tensor(target_value).float().to(device)
         target_reward = torch.tensor(target_reward).float().to(device)
         target_policy = torch.tensor(target_policy).float().to(device)
+        target_policy_mask = torch.tensor(target_policy_mask).float().to(device)
         gradient_scale_batch = torch.tensor(gradient_scale_batch).float().to(device)
         # observation_batch: batch, channels, height, width
         # action_batch: batch, num_unroll_steps+1, 1 (unsqueeze)
         # target_value: batch, num_unroll_steps+1
         # target_reward: batch, num_unroll_steps+1
         # target_policy: batch, num_unroll_steps+1, len(action_space)
+        # target_policy_mask: batch, num_unroll_steps+1
         # gradient_scale_batch: batch, num_unroll_steps+1
 
         target_value = models.scalar_to_support(target_value, self.config.support_size)
@@ -192,7 +195,8 @@ class Trainer:
             target_policy[:, 0],
         )
         value_loss += current_value_loss
-        policy_loss += current_policy_loss
+        # The policies of the fast searches are not trained on (playout cap randomization)
+        policy_loss += current_policy_loss * target_policy_mask[:, 0]
         # Compute priorities for the prioritized replay (See paper appendix Training)
         pred_value_scalar = (
             models.support_to_scalar(value, self.config.support_size)
@@ -220,6 +224,7 @@ class Trainer:
                 target_reward[:, i],
                 target_policy[:, i],
             )
+            current_policy_loss = current_policy_loss * target_policy_mask[:, i]
 
             # Scale gradient by the number of unroll steps (See paper appendix Training)
             current_value_loss.register_hook(